@@ -3,295 +3,154 @@ from enum import Enum
 
 import cv2
 import cv2 as cv
-import numpy as np
-
-
-class GameObject(object):
-    def __init__(self, canvas, item):
-        self.canvas = canvas
-        self.item = item
-
-    def get_position(self):
-        return self.canvas.coords(self.item)
-
-    def move(self, x, y):
-        self.canvas.move(self.item, x, y)
-
-    def delete(self):
-        self.canvas.delete(self.item)
-
-
-class Ball(GameObject):
-    def __init__(self, canvas, x, y):
-        self.radius = 10
-        self.direction = [1, -1]
-        # increase the below value to increase the speed of ball
-        self.speed = 5
-        item = canvas.create_oval(x - self.radius, y - self.radius,
-                                  x + self.radius, y + self.radius,
-                                  fill='white')
-        super(Ball, self).__init__(canvas, item)
-
-    def update(self):
-        coords = self.get_position()
-        width = self.canvas.winfo_width()
-        if coords[0] <= 0 or coords[2] >= width:
-            self.direction[0] *= -1
-        if coords[1] <= 0:
-            self.direction[1] *= -1
-        x = self.direction[0] * self.speed
-        y = self.direction[1] * self.speed
-        self.move(x, y)
-
-    def collide(self, game_objects):
-        coords = self.get_position()
-        x = (coords[0] + coords[2]) * 0.5
-        if len(game_objects) > 1:
-            self.direction[1] *= -1
-        elif len(game_objects) == 1:
-            game_object = game_objects[0]
-            coords = game_object.get_position()
-            if x > coords[2]:
-                self.direction[0] = 1
-            elif x < coords[0]:
-                self.direction[0] = -1
-            else:
-                self.direction[1] *= -1
-
-        for game_object in game_objects:
-            if isinstance(game_object, Brick):
-                game_object.hit()
-
-
-class Paddle(GameObject):
-    def __init__(self, canvas, x, y):
-        self.width = 80
-        self.height = 10
-        self.ball = None
-        item = canvas.create_rectangle(x - self.width / 2,
-                                       y - self.height / 2,
-                                       x + self.width / 2,
-                                       y + self.height / 2,
-                                       fill='#FFB643')
-        super(Paddle, self).__init__(canvas, item)
-
-    def set_ball(self, ball):
-        self.ball = ball
-
-    def move(self, offset):
-        coords = self.get_position()
-        width = self.canvas.winfo_width()
-        if coords[0] + offset >= 0 and coords[2] + offset <= width:
-            super(Paddle, self).move(offset, 0)
-            if self.ball is not None:
-                self.ball.move(offset, 0)
-
-
-class Brick(GameObject):
-    COLORS = {1: '#4535AA', 2: '#ED639E', 3: '#8FE1A2'}
-
-    def __init__(self, canvas, x, y, hits):
-        self.width = 75
-        self.height = 20
-        self.hits = hits
-        color = Brick.COLORS[hits]
-        item = canvas.create_rectangle(x - self.width / 2,
-                                       y - self.height / 2,
-                                       x + self.width / 2,
-                                       y + self.height / 2,
-                                       fill=color, tags='brick')
-        super(Brick, self).__init__(canvas, item)
-
-    def hit(self):
-        self.hits -= 1
-        if self.hits == 0:
-            self.delete()
-        else:
-            self.canvas.itemconfig(self.item,
-                                   fill=Brick.COLORS[self.hits])
-
-
-class Game(tk.Frame):
-    def __init__(self, master):
-        super(Game, self).__init__(master)
-        self.lives = 3
-        self.width = 610
-        self.height = 400
-        self.canvas = tk.Canvas(self, bg='#D6D1F5',
-                                width=self.width,
-                                height=self.height, )
-        self.canvas.pack()
-        self.pack()
-
-        self.items = {}
-        self.ball = None
-        self.paddle = Paddle(self.canvas, self.width / 2, 326)
-        self.items[self.paddle.item] = self.paddle
-
-        self.move_detection = MoveJoystick()
-
-        # adding brick with different hit capacities - 3,2 and 1
-        for x in range(5, self.width - 5, 75):
-            self.add_brick(x + 37.5, 50, 3)
-            self.add_brick(x + 37.5, 70, 2)
-            self.add_brick(x + 37.5, 90, 1)
-
-        self.hud = None
-        self.setup_game()
-        self.canvas.focus_set()
-        # self.canvas.bind('<Left>', lambda _: self.paddle.move(-10))
-        # self.canvas.bind('<Right>', lambda _: self.paddle.move(10))
-
-    def setup_game(self):
-        self.move_detection.destroy_window()
-        self.add_ball()
-        self.update_lives_text()
-        self.text = self.draw_text(300, 200,
-                                   'Click Mouse to start')
-        self.canvas.bind('<Button-1>', lambda _: self.start_game())
-
-    def add_ball(self):
-        if self.ball is not None:
-            self.ball.delete()
-        paddle_coords = self.paddle.get_position()
-        x = (paddle_coords[0] + paddle_coords[2]) * 0.5
-        self.ball = Ball(self.canvas, x, 310)
-        self.paddle.set_ball(self.ball)
-
-    def add_brick(self, x, y, hits):
-        brick = Brick(self.canvas, x, y, hits)
-        self.items[brick.item] = brick
-
-    def draw_text(self, x, y, text, size='40'):
-        font = ('Forte', size)
-        return self.canvas.create_text(x, y, text=text,
-                                       font=font)
-
-    def update_lives_text(self):
-        text = 'Lives: %s' % self.lives
-        if self.hud is None:
-            self.hud = self.draw_text(50, 20, text, 15)
-        else:
-            self.canvas.itemconfig(self.hud, text=text)
-
-    def start_game(self):
-
-        self.move_detection.open_window()
-
-        self.canvas.unbind('<Button-1>')
-        self.canvas.delete(self.text)
-        self.paddle.ball = None
-        self.game_loop()
-
-    def game_loop(self):
-
-        screen_move = self.move_detection.on_move_detection
-
-        if screen_move == Screen.LEFT:
-            self.paddle.move(-15)
-        elif screen_move == Screen.RIGHT:
-            self.paddle.move(15)
-
-        self.check_collisions()
-        num_bricks = len(self.canvas.find_withtag('brick'))
-        if num_bricks == 0:
-            self.ball.speed = None
-            self.draw_text(300, 200, 'You win! You the Breaker of Bricks.')
-        elif self.ball.get_position()[3] >= self.height:
-            self.ball.speed = None
-            self.lives -= 1
-            if self.lives < 0:
-                self.move_detection.destroy_window()
-                self.draw_text(300, 200, 'You Lose! Game Over!')
-            else:
-                self.after(1000, self.setup_game)
-        else:
-            self.ball.update()
-            self.after(50, self.game_loop)
 
-    def check_collisions(self):
-        ball_coords = self.ball.get_position()
-        items = self.canvas.find_overlapping(*ball_coords)
-        objects = [self.items[x] for x in items if x in self.items]
-        self.ball.collide(objects)
+import breakout_game
+from frame_capture import FrameCapture
+from instrumentation import get_profiler
+from optical_flow import create_flow_engine
+from preview import create_preview
+from processing import downscale, scale_kernel
+from quality import get_governor
+
+
+class Game(breakout_game.Game):
+    def __init__(self, master, **kwargs):
+        super(Game, self).__init__(master, MoveJoystick, 'on_move_detection', Screen, 15, **kwargs)
 
 
 class MoveJoystick:
 
-    def __init__(self):
+    def __init__(self, scale=1.0, engine='farneback', preview='window', source=0, name='move', profiler=None,
+                 quality=None):
         self.next_gray = None
         self.previous_gray = None
-        self.cap = cv2.VideoCapture()
+        # the blurred frame before previous_gray, reused for the next one
+        self.spare_gray = None
+        self.buffers = {}
+        self.cap = FrameCapture(source)
+        self.profiler = get_profiler(profiler, name)
         self.window_name = "Motion Play!"
+        self.preview = create_preview(preview, self.window_name)
+        self.side = Screen.CENTER
+        self.motion = (0, 0)
+        # optical flow only tells which way the player moves, so the game
+        # steps the paddle by the side, engine='difference' also follows
+        # where they are
+        self.position = None
+        self.frame_index = 0
+        self.frame_time = 0.0
+
+        # flow is computed on frames downscaled once after capture, so the
+        # kernel, window and flow thresholds shrink with the scale and the
+        # pixel count threshold with the area
+        self.scale = scale
+        self.blur_size = scale_kernel(25, scale)
+
+        # 'farneback', 'dis', 'lucas_kanade', 'difference' or an object with
+        # reset() and motion(previous_gray, next_gray) -> (left_move, right_move)
+        self.engine = engine
+        self.flow_engine = create_flow_engine(engine, scale)
+
+        # an optional QualityGovernor lowers the scale and blur, and skips
+        # frames, while detection runs over its time budget
+        self.base_scale = scale
+        self.quality = get_governor(quality)
+        self.quality.attach(self.set_quality)
+
+    def set_quality(self, tier):
+        self.scale = self.base_scale * tier['scale']
+        self.blur_size = scale_kernel(25 * tier['blur'], self.scale)
+        self.flow_engine = create_flow_engine(self.engine, self.scale)
+        # the flow needs two frames of the same size
+        self.previous_gray = None
 
     def open_window(self):
 
         if not self.cap.isOpened():
-            self.cap.open(0)
-
-        ret, frame1 = self.cap.read()
-        frame1 = cv2.flip(frame1, 1)
-        blur1 = cv2.GaussianBlur(frame1, (25, 25), 0)
+            self.cap.open()
 
-        #cv2.imshow("Gaussian blur", blur1)
+        # also when resuming after a lost life: the last frame before the
+        # pause is stale, so the first fresh frame seeds the flow again
+        self.cap.resume()
+        self.previous_gray = None
 
-        self.previous_gray = cv2.cvtColor(blur1, cv.COLOR_BGR2GRAY)
+    def pause(self):
+        self.cap.pause()
+        self.side = Screen.CENTER
+        self.motion = (0, 0)
+        self.position = None
+        self.flow_engine.reset()
 
     @property
     def on_move_detection(self):
         cap = self.cap
+        profiler = self.profiler
 
-        ret, frame2 = cap.read()
-        frame2 = cv2.flip(frame2, 1)
-        blur2 = cv2.cvtColor(frame2, cv.COLOR_BGR2GRAY)
+        with profiler.span('capture'):
+            frame2, frame_time, frame_index = cap.read_latest()
 
-        self.next_gray = cv2.GaussianBlur(blur2, (25, 25), 0)
+        # flow between a frame and itself is zero, keep the previous decision
+        if frame2 is None or frame_index == self.frame_index:
+            return self.side
 
-        farneback = cv2.calcOpticalFlowFarneback(prev=self.previous_gray, next=self.next_gray, flow=None,
-                                                 pyr_scale=0.5,  # 0.5,
-                                                 levels=1,  # 3,
-                                                 winsize=10,  # 15,
-                                                 iterations=1,  # 3,
-                                                 poly_n=5,
-                                                 poly_sigma=1.1,
-                                                 flags=0)
-        threshold = 2.0
+        self.frame_index = frame_index
 
-        # flow_norm = np.sqrt(farneback[:, :, 0] ** 2 + farneback[:, :, 1] ** 2)
-        # flow_norm_norm = cv2.normalize(flow_norm, None, 0.0, 1.0, cv2.NORM_MINMAX)
-        # cv2.imshow("Flow", flow_norm_norm)
+        self.quality.run(self.process_frame, frame2, frame_time)
+        return self.side
 
-        flow_xx = farneback[:, :, 0]
+    def process_frame(self, frame2, frame_time):
+        profiler = self.profiler
+        # the position is only as new as the last frame processed, skipped
+        # frames keep the old time
+        self.frame_time = frame_time
 
-        left_move = np.count_nonzero(flow_xx < -threshold)
-        right_move = np.count_nonzero(flow_xx > threshold)
+        # the frame is processed as captured and the motion mirrored after,
+        # so only a preview that is actually shown gets flipped
+        buffers = self.buffers
+        with profiler.span('resize'):
+            small = downscale(frame2, self.scale, buffers)
+        with profiler.span('colour'):
+            blur2 = buffers['gray'] = cv2.cvtColor(small, cv.COLOR_BGR2GRAY, dst=buffers.get('gray'))
 
-        cv2.imshow(self.window_name, frame2)
+        with profiler.span('blur'):
+            self.next_gray = cv2.GaussianBlur(blur2, (self.blur_size, self.blur_size), 0, dst=self.spare_gray)
 
-        # print("Going left: " + str(left_move))
-        # print("Going right: " + str(right_move))
+        if self.previous_gray is None:
+            self.previous_gray = self.next_gray
+            self.spare_gray = None
+            return
+
+        with profiler.span('detect'):
+            right_move, left_move = self.flow_engine.motion(self.previous_gray, self.next_gray)
+        self.motion = (left_move, right_move)
+        position = getattr(self.flow_engine, 'position', None)
+        self.position = None if position is None else 1 - position
 
-        if left_move < 300:
-            left_move = 0
+        with profiler.span('preview'):
+            if self.preview.due():
+                self.preview.show(self.preview.mirror(frame2))
 
-        if right_move < 300:
-            right_move = 0
+        # print("Going left: " + str(left_move))
+        # print("Going right: " + str(right_move))
 
+        self.spare_gray = self.previous_gray
         self.previous_gray = self.next_gray
 
-        if left_move > right_move:
-            return Screen.LEFT
-        elif left_move < right_move:
-            return Screen.RIGHT
-        else:
-            return Screen.CENTER
+        with profiler.span('decision'):
+            if left_move > right_move:
+                self.side = Screen.LEFT
+            elif left_move < right_move:
+                self.side = Screen.RIGHT
+            else:
+                self.side = Screen.CENTER
 
     def destroy_window(self):
         cap = self.cap
 
         if cap.isOpened():
             cap.release()
-            cv2.destroyWindow(self.window_name)
+            self.frame_index = 0
+            self.preview.close()
 
 
 class Screen(Enum):
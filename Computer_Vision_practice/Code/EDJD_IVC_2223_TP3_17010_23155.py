@@ -1,239 +1,154 @@
+import os
+import sys
 import tkinter as tk
 from enum import Enum
+from functools import lru_cache
 import cv2
 
+import breakout_game
+from frame_capture import FrameCapture
+from instrumentation import get_profiler
+from preview import create_preview
+from processing import downscale, mirror_box, scale_box
+from quality import get_governor
 
-class GameObject(object):
-    def __init__(self, canvas, item):
-        self.canvas = canvas
-        self.item = item
-
-    def get_position(self):
-        return self.canvas.coords(self.item)
-
-    def move(self, x, y):
-        self.canvas.move(self.item, x, y)
-
-    def delete(self):
-        self.canvas.delete(self.item)
-
-
-class Ball(GameObject):
-    def __init__(self, canvas, x, y):
-        self.radius = 10
-        self.direction = [1, -1]
-        # increase the below value to increase the speed of ball
-        self.speed = 5
-        item = canvas.create_oval(x - self.radius, y - self.radius,
-                                  x + self.radius, y + self.radius,
-                                  fill='white')
-        super(Ball, self).__init__(canvas, item)
-
-    def update(self):
-        coords = self.get_position()
-        width = self.canvas.winfo_width()
-        if coords[0] <= 0 or coords[2] >= width:
-            self.direction[0] *= -1
-        if coords[1] <= 0:
-            self.direction[1] *= -1
-        x = self.direction[0] * self.speed
-        y = self.direction[1] * self.speed
-        self.move(x, y)
-
-    def collide(self, game_objects):
-        coords = self.get_position()
-        x = (coords[0] + coords[2]) * 0.5
-        if len(game_objects) > 1:
-            self.direction[1] *= -1
-        elif len(game_objects) == 1:
-            game_object = game_objects[0]
-            coords = game_object.get_position()
-            if x > coords[2]:
-                self.direction[0] = 1
-            elif x < coords[0]:
-                self.direction[0] = -1
-            else:
-                self.direction[1] *= -1
-
-        for game_object in game_objects:
-            if isinstance(game_object, Brick):
-                game_object.hit()
-
-
-class Paddle(GameObject):
-    def __init__(self, canvas, x, y):
-        self.width = 80
-        self.height = 10
-        self.ball = None
-        item = canvas.create_rectangle(x - self.width / 2,
-                                       y - self.height / 2,
-                                       x + self.width / 2,
-                                       y + self.height / 2,
-                                       fill='#FFB643')
-        super(Paddle, self).__init__(canvas, item)
-
-    def set_ball(self, ball):
-        self.ball = ball
-
-    def move(self, offset):
-        coords = self.get_position()
-        width = self.canvas.winfo_width()
-        if coords[0] + offset >= 0 and coords[2] + offset <= width:
-            super(Paddle, self).move(offset, 0)
-            if self.ball is not None:
-                self.ball.move(offset, 0)
-
-
-class Brick(GameObject):
-    COLORS = {1: '#4535AA', 2: '#ED639E', 3: '#8FE1A2'}
-
-    def __init__(self, canvas, x, y, hits):
-        self.width = 75
-        self.height = 20
-        self.hits = hits
-        color = Brick.COLORS[hits]
-        item = canvas.create_rectangle(x - self.width / 2,
-                                       y - self.height / 2,
-                                       x + self.width / 2,
-                                       y + self.height / 2,
-                                       fill=color, tags='brick')
-        super(Brick, self).__init__(canvas, item)
-
-    def hit(self):
-        self.hits -= 1
-        if self.hits == 0:
-            self.delete()
-        else:
-            self.canvas.itemconfig(self.item,
-                                   fill=Brick.COLORS[self.hits])
-
-
-class Game(tk.Frame):
-    def __init__(self, master):
-        super(Game, self).__init__(master)
-        self.lives = 3
-        self.width = 610
-        self.height = 400
-        self.canvas = tk.Canvas(self, bg='#D6D1F5',
-                                width=self.width,
-                                height=self.height, )
-        self.canvas.pack()
-        self.pack()
-
-        self.items = {}
-        self.ball = None
-        self.movement_detection = FaceJoystick()
-        self.paddle = Paddle(self.canvas, self.width / 2, 326)
-        self.items[self.paddle.item] = self.paddle
-        # adding brick with different hit capacities - 3,2 and 1
-        for x in range(5, self.width - 5, 75):
-            self.add_brick(x + 37.5, 50, 3)
-            self.add_brick(x + 37.5, 70, 2)
-            self.add_brick(x + 37.5, 90, 1)
-
-        self.hud = None
-        self.setup_game()
-        self.canvas.focus_set()
-
-    def setup_game(self):
-        self.movement_detection.destroy_window()
-        self.add_ball()
-        self.update_lives_text()
-        self.text = self.draw_text(300, 200,
-                                   'Click mouse to start')
-        self.canvas.bind('<Button-1>', lambda _: self.start_game())
-
-    def add_ball(self):
-        if self.ball is not None:
-            self.ball.delete()
-        paddle_coords = self.paddle.get_position()
-        x = (paddle_coords[0] + paddle_coords[2]) * 0.5
-        self.ball = Ball(self.canvas, x, 310)
-        self.paddle.set_ball(self.ball)
-
-    def add_brick(self, x, y, hits):
-        brick = Brick(self.canvas, x, y, hits)
-        self.items[brick.item] = brick
-
-    def draw_text(self, x, y, text, size='40'):
-        font = ('Forte', size)
-        return self.canvas.create_text(x, y, text=text,
-                                       font=font)
-
-    def update_lives_text(self):
-        text = 'Lives: %s' % self.lives
-        if self.hud is None:
-            self.hud = self.draw_text(50, 20, text, 15)
-        else:
-            self.canvas.itemconfig(self.hud, text=text)
-
-    def start_game(self):
-        self.movement_detection.open_window()
-        self.canvas.unbind('<Button-1>')
-        self.canvas.delete(self.text)
-        self.paddle.ball = None
-        self.game_loop()
-
-    def game_loop(self):
-
-        screen_move = self.movement_detection.face_on_detection
-
-        if screen_move == Screen.LEFT:
-            self.paddle.move(-10)
-        elif screen_move == Screen.RIGHT:
-            self.paddle.move(10)
-
-        self.check_collisions()
-        num_bricks = len(self.canvas.find_withtag('brick'))
-        if num_bricks == 0:
-            self.ball.speed = None
-            self.draw_text(300, 200, 'You win! You the Breaker of Bricks.')
-        elif self.ball.get_position()[3] >= self.height:
-            self.ball.speed = None
-            self.lives -= 1
-            if self.lives < 0:
-                self.movement_detection.destroy_window()
-                self.draw_text(300, 200, 'You Lose! Game Over!')
-            else:
-                self.after(1000, self.setup_game)
-        else:
-            self.ball.update()
-            self.after(50, self.game_loop)
 
-    def check_collisions(self):
-        ball_coords = self.ball.get_position()
-        items = self.canvas.find_overlapping(*ball_coords)
-        objects = [self.items[x] for x in items if x in self.items]
-        self.ball.collide(objects)
+class Game(breakout_game.Game):
+    def __init__(self, master, **kwargs):
+        super(Game, self).__init__(master, FaceJoystick, 'face_on_detection', Screen, 10,
+                                   options={'detect_every': 10}, **kwargs)
+
+
+FACE_CASCADE_FILE = 'haarcascade_frontalface_alt.xml'
+
+
+def get_face_cascade_path():
+    # IVC_FACE_CASCADE overrides the cascade bundled with OpenCV
+    path = os.environ.get('IVC_FACE_CASCADE')
+    if path:
+        return path
+
+    data = getattr(cv2, 'data', None)
+    if data is not None:
+        return os.path.join(data.haarcascades, FACE_CASCADE_FILE)
+
+    # conda builds of OpenCV keep the cascades inside the environment
+    return os.path.join(sys.prefix, 'Library', 'etc', 'haarcascades', FACE_CASCADE_FILE)
+
+
+@lru_cache(maxsize=None)
+def read_cascade(path):
+    cascade = cv2.CascadeClassifier(path)
+    if cascade.empty():
+        raise IOError("Could not load cascade from '{}'".format(path))
+
+    return cascade
+
+
+def load_face_cascade(path=None):
+    # parsed once per process and shared by every FaceJoystick
+    if path is None:
+        path = get_face_cascade_path()
+
+    return read_cascade(os.path.abspath(path))
 
 
 class FaceJoystick:
 
-    def __init__(self):
-        self.cap = cv2.VideoCapture()
+    def __init__(self, face_cascade=None, cascade_path=None, detect_every=1, track_threshold=0.6, scale=1.0,
+                 preview='window', source=0, name='face', profiler=None, quality=None):
+        if face_cascade is None:
+            face_cascade = load_face_cascade(cascade_path)
+
+        self.face_cascade = face_cascade
+        self.cap = FrameCapture(source)
+        self.profiler = get_profiler(profiler, name)
         self.window_name = "Play Smiling!"
+        self.preview = create_preview(preview, self.window_name)
+        self.side = Screen.CENTER
+        # x of the face, 0 at the left of the screen and 1 at the right
+        self.position = None
+        self.frame_index = 0
+        self.frame_time = 0.0
+
+        # with detect_every > 1 the cascade only runs every N frames, or
+        # sooner when the template tracker loses the face
+        self.detect_every = detect_every
+        self.track_threshold = track_threshold
+        self.face_box = []
+        self.face_template = None
+        self.frames_since_detection = 0
+
+        # the cascade and tracker see a frame downscaled once after capture,
+        # boxes are mapped back to full resolution for drawing and decisions
+        self.scale = scale
+        self.buffers = {}
+
+        # an optional QualityGovernor lowers the scale, and skips frames,
+        # while detection runs over its time budget
+        self.base_scale = scale
+        self.quality = get_governor(quality)
+        self.quality.attach(self.set_quality)
+
+    def set_quality(self, tier):
+        self.scale = self.base_scale * tier['scale']
+        # the last face is in the coordinates of the old scale
+        self.face_box = []
+        self.face_template = None
 
     def open_window(self):
         if not self.cap.isOpened():
-            self.cap.open(0)
+            self.cap.open()
+        self.cap.resume()
+
+    def pause(self):
+        self.cap.pause()
+        self.side = Screen.CENTER
+        self.position = None
+        self.face_box = []
+        self.face_template = None
 
     @property
     def face_on_detection(self):
         cap = self.cap
-        ret, image = cap.read()
-        image = cv2.flip(image, 1)
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        profiler = self.profiler
 
-        face_cascade = cv2.CascadeClassifier('C:/Users/adema/anaconda3/envs/IVC/Library/etc/haarcascades'
-                                             '/haarcascade_frontalface_alt.xml')
-        faces = face_cascade.detectMultiScale(gray)
-        print("{} faces detected".format(len(faces)))
+        with profiler.span('capture'):
+            image, frame_time, frame_index = cap.read_latest()
+
+        # no new frame since the last tick, keep the previous decision
+        if image is None or frame_index == self.frame_index:
+            return self.side
+
+        self.frame_index = frame_index
+
+        self.quality.run(self.process_frame, image, frame_time)
+        return self.side
+
+    def process_frame(self, image, frame_time):
+        profiler = self.profiler
+        # the position is only as new as the last frame processed, skipped
+        # frames keep the old time
+        self.frame_time = frame_time
+
+        buffers = self.buffers
+        with profiler.span('resize'):
+            small = downscale(image, self.scale, buffers)
+        with profiler.span('colour'):
+            gray = buffers['gray'] = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=buffers.get('gray'))
 
         bounding_box_center = [0, 0]
-        bounding_box = self.get_box(faces)
+        bounding_box = self.find_face(gray)
 
         if len(bounding_box) == 0:
-            return Screen.CENTER
+            self.side = Screen.CENTER
+            self.position = None
+            return
+
+        bounding_box = scale_box(bounding_box, image.shape[1] / small.shape[1])
+        # the frame is processed as captured, the box is mirrored for the
+        # decision and the preview
+        bounding_box = mirror_box(bounding_box, image.shape[1])
 
         x = bounding_box[0]
         y = bounding_box[1]
@@ -245,22 +160,85 @@ class FaceJoystick:
         bounding_box_center[0] = x + x_point_o
         bounding_box_center[1] = y + y_point_o
 
-        start_point = (x, y)
-        end_point = (x + width, y + height)
+        with profiler.span('preview'):
+            if self.preview.due():
+                display = self.preview.mirror(image)
+                start_point = (x, y)
+                end_point = (x + width, y + height)
+
+                cv2.rectangle(display, start_point, end_point, (0, 0, 0), 2)
 
-        cv2.rectangle(image, start_point, end_point, (0, 0, 0), 2)
+                self.preview.show(display)
 
         pixel_threshold = 20
         image_x_center = image.shape[1] / 2
 
-        cv2.imshow(self.window_name, image)
+        with profiler.span('decision'):
+            self.position = bounding_box_center[0] / image.shape[1]
+            if image_x_center - pixel_threshold > bounding_box_center[0]:
+                self.side = Screen.LEFT
+            elif image_x_center + pixel_threshold < bounding_box_center[0]:
+                self.side = Screen.RIGHT
+            else:
+                self.side = Screen.CENTER
+
+    def find_face(self, gray):
+        if self.face_template is not None and self.frames_since_detection < self.detect_every:
+            with self.profiler.span('track'):
+                bounding_box = self.track_face(gray)
+            if len(bounding_box) > 0:
+                self.frames_since_detection += 1
+                self.face_box = bounding_box
+                return bounding_box
+
+        with self.profiler.span('detect'):
+            bounding_box = self.detect_face(gray)
+        self.face_box = bounding_box
+        self.frames_since_detection = 1
+
+        if len(bounding_box) > 0 and self.detect_every > 1:
+            x, y, width, height = bounding_box
+            self.face_template = gray[y:y + height, x:x + width].copy()
+        else:
+            self.face_template = None
 
-        if image_x_center - pixel_threshold > bounding_box_center[0]:
-            return Screen.LEFT
-        elif image_x_center + pixel_threshold < bounding_box_center[0]:
-            return Screen.RIGHT
+        return bounding_box
+
+    def detect_face(self, gray):
+        if len(self.face_box) > 0 and self.detect_every > 1:
+            # the face can only grow or shrink so much between detections
+            size = self.face_box[2]
+            min_size = int(size * 0.7)
+            max_size = int(size * 1.4)
+            faces = self.face_cascade.detectMultiScale(gray, minSize=(min_size, min_size),
+                                                       maxSize=(max_size, max_size))
         else:
-            return Screen.CENTER
+            faces = self.face_cascade.detectMultiScale(gray)
+
+        self.preview.log("{} faces detected".format(len(faces)))
+
+        return self.get_box(faces)
+
+    def track_face(self, gray):
+        x, y, width, height = self.face_box
+
+        # search half a face around the previous box
+        x0 = max(x - width // 2, 0)
+        y0 = max(y - height // 2, 0)
+        x1 = min(x + width + width // 2, gray.shape[1])
+        y1 = min(y + height + height // 2, gray.shape[0])
+        window = gray[y0:y1, x0:x1]
+
+        if window.shape[0] < height or window.shape[1] < width:
+            return []
+
+        result = cv2.matchTemplate(window, self.face_template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, location = cv2.minMaxLoc(result)
+
+        if score < self.track_threshold:
+            return []
+
+        return [x0 + location[0], y0 + location[1], width, height]
 
     @staticmethod
     def get_box(faces):
@@ -273,6 +251,7 @@ class FaceJoystick:
             if max_area > current_area:
                 continue
 
+            max_area = current_area
             bounding_box = [x, y, width, height]
 
         return bounding_box
@@ -282,7 +261,10 @@ class FaceJoystick:
 
         if cap.isOpened():
             cap.release()
-            cv2.destroyWindow(self.window_name)
+            self.frame_index = 0
+            self.face_box = []
+            self.face_template = None
+            self.preview.close()
 
 
 class Screen(Enum):
@@ -5,271 +5,267 @@ import cv2
 import cv2 as cv
 import numpy as np
 
+import breakout_game
+from colour_lut import MaskLookup
+from frame_capture import FrameCapture
+from instrumentation import get_profiler
+from preview import create_preview
+from processing import downscale, mirror_box, scale_box, scale_kernel
+from quality import get_governor
 
-class GameObject(object):
-    def __init__(self, canvas, item):
-        self.canvas = canvas
-        self.item = item
-
-    def get_position(self):
-        return self.canvas.coords(self.item)
-
-    def move(self, x, y):
-        self.canvas.move(self.item, x, y)
-
-    def delete(self):
-        self.canvas.delete(self.item)
-
-
-class Ball(GameObject):
-    def __init__(self, canvas, x, y):
-        self.radius = 10
-        self.direction = [1, -1]
-        # increase the below value to increase the speed of ball
-        self.speed = 5
-        item = canvas.create_oval(x - self.radius, y - self.radius,
-                                  x + self.radius, y + self.radius,
-                                  fill='white')
-        super(Ball, self).__init__(canvas, item)
-
-    def update(self):
-        coords = self.get_position()
-        width = self.canvas.winfo_width()
-        if coords[0] <= 0 or coords[2] >= width:
-            self.direction[0] *= -1
-        if coords[1] <= 0:
-            self.direction[1] *= -1
-        x = self.direction[0] * self.speed
-        y = self.direction[1] * self.speed
-        self.move(x, y)
-
-    def collide(self, game_objects):
-        coords = self.get_position()
-        x = (coords[0] + coords[2]) * 0.5
-        if len(game_objects) > 1:
-            self.direction[1] *= -1
-        elif len(game_objects) == 1:
-            game_object = game_objects[0]
-            coords = game_object.get_position()
-            if x > coords[2]:
-                self.direction[0] = 1
-            elif x < coords[0]:
-                self.direction[0] = -1
-            else:
-                self.direction[1] *= -1
-
-        for game_object in game_objects:
-            if isinstance(game_object, Brick):
-                game_object.hit()
-
-
-class Paddle(GameObject):
-    def __init__(self, canvas, x, y):
-        self.width = 80
-        self.height = 10
-        self.ball = None
-        item = canvas.create_rectangle(x - self.width / 2,
-                                       y - self.height / 2,
-                                       x + self.width / 2,
-                                       y + self.height / 2,
-                                       fill='#FFB643')
-        super(Paddle, self).__init__(canvas, item)
-
-    def set_ball(self, ball):
-        self.ball = ball
-
-    def move(self, offset):
-        coords = self.get_position()
-        width = self.canvas.winfo_width()
-        if coords[0] + offset >= 0 and coords[2] + offset <= width:
-            super(Paddle, self).move(offset, 0)
-            if self.ball is not None:
-                self.ball.move(offset, 0)
-
-
-class Brick(GameObject):
-    COLORS = {1: '#4535AA', 2: '#ED639E', 3: '#8FE1A2'}
-
-    def __init__(self, canvas, x, y, hits):
-        self.width = 75
-        self.height = 20
-        self.hits = hits
-        color = Brick.COLORS[hits]
-        item = canvas.create_rectangle(x - self.width / 2,
-                                       y - self.height / 2,
-                                       x + self.width / 2,
-                                       y + self.height / 2,
-                                       fill=color, tags='brick')
-        super(Brick, self).__init__(canvas, item)
-
-    def hit(self):
-        self.hits -= 1
-        if self.hits == 0:
-            self.delete()
-        else:
-            self.canvas.itemconfig(self.item,
-                                   fill=Brick.COLORS[self.hits])
-
-
-class Game(tk.Frame):
-    def __init__(self, master):
-        super(Game, self).__init__(master)
-        self.lives = 3
-        self.width = 610
-        self.height = 400
-        self.canvas = tk.Canvas(self, bg='#D6D1F5',
-                                width=self.width,
-                                height=self.height, )
-        self.canvas.pack()
-        self.pack()
-
-        self.items = {}
-        self.ball = None
-        self.paddle = Paddle(self.canvas, self.width / 2, 326)
-        self.items[self.paddle.item] = self.paddle
-
-        self.objectDetection = ObjectJoystick()
-
-        # adding brick with different hit capacities - 3,2 and 1
-        for x in range(5, self.width - 5, 75):
-            self.add_brick(x + 37.5, 50, 3)
-            self.add_brick(x + 37.5, 70, 2)
-            self.add_brick(x + 37.5, 90, 1)
-
-        self.hud = None
-        self.setup_game()
-        self.canvas.focus_set()
-        # self.canvas.bind('<Left>', lambda _: self.paddle.move(-10))
-        # self.canvas.bind('<Right>', lambda _: self.paddle.move(10))
-
-    def setup_game(self):
-        self.objectDetection.destroy_window()
-        self.add_ball()
-        self.update_lives_text()
-        self.text = self.draw_text(300, 200,
-                                   'Click mouse to start')
-        self.canvas.bind('<Button-1>', lambda _: self.start_game())
-
-    def add_ball(self):
-        if self.ball is not None:
-            self.ball.delete()
-        paddle_coords = self.paddle.get_position()
-        x = (paddle_coords[0] + paddle_coords[2]) * 0.5
-        self.ball = Ball(self.canvas, x, 310)
-        self.paddle.set_ball(self.ball)
-
-    def add_brick(self, x, y, hits):
-        brick = Brick(self.canvas, x, y, hits)
-        self.items[brick.item] = brick
-
-    def draw_text(self, x, y, text, size='40'):
-        font = ('Forte', size)
-        return self.canvas.create_text(x, y, text=text,
-                                       font=font)
-
-    def update_lives_text(self):
-        text = 'Lives: %s' % self.lives
-        if self.hud is None:
-            self.hud = self.draw_text(50, 20, text, 15)
-        else:
-            self.canvas.itemconfig(self.hud, text=text)
-
-    def start_game(self):
-
-        self.objectDetection.open_window()
-
-        self.canvas.unbind('<Button-1>')
-        self.canvas.delete(self.text)
-        self.paddle.ball = None
-        self.game_loop()
-
-    def game_loop(self):
-
-        self.objectDetection.detect_camera_object()
-
-        screen_side = self.objectDetection.side
-
-        if screen_side == Screen.LEFT:
-            self.paddle.move(-15)
-        elif screen_side == Screen.RIGHT:
-            self.paddle.move(15)
-
-        self.check_collisions()
-        num_bricks = len(self.canvas.find_withtag('brick'))
-        if num_bricks == 0:
-            self.objectDetection.destroy_window()
-            self.ball.speed = None
-            self.draw_text(300, 200, 'You win! You the Breaker of Bricks.')
-        elif self.ball.get_position()[3] >= self.height:
-            self.ball.speed = None
-            self.lives -= 1
-            if self.lives < 0:
-                self.objectDetection.destroy_window()
-                self.draw_text(300, 200, 'You Lose! Game Over!')
-            else:
-                self.after(1000, self.setup_game)
-        else:
-            self.ball.update()
-            self.after(50, self.game_loop)
 
-    def check_collisions(self):
-        ball_coords = self.ball.get_position()
-        items = self.canvas.find_overlapping(*ball_coords)
-        objects = [self.items[x] for x in items if x in self.items]
-        self.ball.collide(objects)
+class Game(breakout_game.Game):
+    def __init__(self, master, **kwargs):
+        super(Game, self).__init__(master, ObjectJoystick, 'detect_camera_object', Screen, 15,
+                                   options={'track': True}, **kwargs)
 
 
 class ObjectJoystick:
-
-    def __init__(self):
-        self.cap = cv2.VideoCapture()
+    LIGHT_BLUE = [90, 80, 0]
+    DARK_BLUE = [130, 255, 255]
+
+    def __init__(self, track=False, track_margin=20, min_fill=0.2, scale=1.0, colour_lut=False, lut_bits=8,
+                 blobs='contours', draw_contours=True, preview='window', source=0, name='object', profiler=None,
+                 quality=None):
+        self.cap = FrameCapture(source)
+        self.profiler = get_profiler(profiler, name)
         self.side = Screen.MIDDLE
+        # x of the object, 0 at the left of the screen and 1 at the right
+        self.position = None
         self.windowName = "Play!"
+        self.preview = create_preview(preview, self.windowName)
+        self.frame_index = 0
+        self.frame_time = 0.0
+
+        # frames are downscaled once after capture, kernels and margins
+        # follow the scale and positions are mapped back to full resolution
+        self.scale = scale
+        self.blur_size = scale_kernel(25, scale)
+
+        # the BGR to mask mapping never changes, so it can be precomputed
+        # once (and cached on disk) instead of converting every frame to HSV
+        self.mask_lookup = None
+        if colour_lut:
+            self.mask_lookup = MaskLookup(self.LIGHT_BLUE, self.DARK_BLUE, lut_bits)
+
+        # with track=True the object is followed with CamShift inside a
+        # window around its last position, and the whole frame is only
+        # searched again when the window holds too little of the object
+        self.track = track
+        self.track_margin = track_margin
+        self.min_fill = min_fill
+        self.track_window = None
+
+        # blobs='components' picks the largest blob with a single
+        # connectedComponentsWithStats call instead of walking contours
+        self.blobs = blobs
+        self.draw_contours = draw_contours
+
+        # outputs of the per-frame operations, reused while the size of
+        # what they hold stays the same (whole frames and track windows
+        # keep separate sets)
+        self.light_blue = np.array(self.LIGHT_BLUE)
+        self.dark_blue = np.array(self.DARK_BLUE)
+        self.frame_buffers = {}
+        self.track_buffers = {}
+
+        # an optional QualityGovernor lowers the scale and blur, and skips
+        # frames, while detection runs over its time budget
+        self.base_scale = scale
+        self.quality = get_governor(quality)
+        self.quality.attach(self.set_quality)
+
+    def set_quality(self, tier):
+        self.scale = self.base_scale * tier['scale']
+        self.blur_size = scale_kernel(25 * tier['blur'], self.scale)
+        # the track window is in the coordinates of the old scale
+        self.track_window = None
 
     def open_window(self):
         if not self.cap.isOpened():
-            self.cap.open(0)
+            self.cap.open()
+        self.cap.resume()
 
-    def get_mask(self, image):
+    def pause(self):
+        self.cap.pause()
+        self.side = Screen.MIDDLE
+        self.position = None
+        self.track_window = None
+
+    def get_mask(self, image, buffers=None):
+        profiler = self.profiler
+        if buffers is None:
+            buffers = {}
 
-        blur = cv2.GaussianBlur(image, (25, 25), 0)
+        with profiler.span('blur'):
+            blur = buffers['blur'] = cv2.GaussianBlur(image, (self.blur_size, self.blur_size), 0,
+                                                      dst=buffers.get('blur'))
         # cv2.imshow("Blur", blur)
 
-        hsv = cv2.cvtColor(blur, cv.COLOR_BGR2HSV)
+        if self.mask_lookup is not None:
+            with profiler.span('colour'):
+                return self.mask_lookup.apply(blur)
 
-        # threshold blue
+        with profiler.span('colour'):
+            hsv = buffers['hsv'] = cv2.cvtColor(blur, cv.COLOR_BGR2HSV, dst=buffers.get('hsv'))
 
-        # blue testing
+            # threshold blue
 
-        # blueBGR = np.uint8([[[255, 0, 0]]])
-        # hsv_blue = cv2.cvtColor(blueBGR, cv2.COLOR_BGR2HSV)
-        # print(hsv_blue)
+            # blue testing
 
-        light_blue = np.array([90, 80, 0])
-        dark_blue = np.array([130, 255, 255])
+            # blueBGR = np.uint8([[[255, 0, 0]]])
+            # hsv_blue = cv2.cvtColor(blueBGR, cv2.COLOR_BGR2HSV)
+            # print(hsv_blue)
 
-        # mask = cv2.inRange(hsv, light_blue, dark_blue)
-        # cv2.imshow("mask", mask)
+            # mask = cv2.inRange(hsv, light_blue, dark_blue)
+            # cv2.imshow("mask", mask)
 
-        return cv2.inRange(hsv, light_blue, dark_blue)
+            mask = buffers['mask'] = cv2.inRange(hsv, self.light_blue, self.dark_blue, dst=buffers.get('mask'))
+            return mask
 
     def detect_camera_object(self):
         cap = self.cap
-        _, image = cap.read()
-        image = cv2.flip(image, 1)
+        profiler = self.profiler
+
+        with profiler.span('capture'):
+            image, frame_time, frame_index = cap.read_latest()
+
+        # no new frame since the last tick, keep the previous decision
+        if image is None or frame_index == self.frame_index:
+            return
+
+        self.frame_index = frame_index
+
+        self.quality.run(self.process_frame, image, frame_time)
+
+    def process_frame(self, image, frame_time):
+        profiler = self.profiler
+        # the position is only as new as the last frame processed, skipped
+        # frames keep the old time
+        self.frame_time = frame_time
+
+        # the frame is processed as captured, only the preview is flipped
+        # and the centre is mirrored in set_center
+        with profiler.span('resize'):
+            small = downscale(image, self.scale, self.frame_buffers)
+        ratio = image.shape[1] / small.shape[1]
+        width = image.shape[1]
+
+        display = None
+        if self.preview.due():
+            with profiler.span('preview'):
+                display = self.preview.mirror(image)
+
+        if self.track and self.track_window is not None:
+            with profiler.span('track'):
+                center = self.track_camera_object(small)
+
+            if center is not None:
+                with profiler.span('preview'):
+                    if display is not None:
+                        if self.draw_contours:
+                            self.draw_box(display, mirror_box(scale_box(self.track_window, ratio), width))
+                        self.preview.show(display)
+                with profiler.span('decision'):
+                    self.set_center(image, scale_box(center, ratio))
+                return
+
+        mask = self.get_mask(small, self.frame_buffers)
+        draw = self.draw_contours and display is not None
+
+        with profiler.span('detect'):
+            if self.blobs == 'components':
+                blob = self.get_largest_component(mask)
+            else:
+                blob = self.get_largest_contour(mask, display if draw else None, ratio)
+
+        with profiler.span('preview'):
+            if self.blobs == 'components' and blob is not None and draw:
+                self.draw_box(display, mirror_box(scale_box(blob[1], ratio), width))
+            if display is not None:
+                self.preview.show(display)
+
+        with profiler.span('decision'):
+            if blob is not None:
+                _, box, center = blob
+                self.set_center(image, scale_box(center, ratio))
+                self.track_window = box
+            else:
+                self.side = Screen.MIDDLE
+                self.position = None
+                self.track_window = None
 
-        mask = self.get_mask(image)
+    def set_center(self, image, center):
+        # where the centre would be on the mirrored frame
+        center = [image.shape[1] - 1 - center[0], center[1]]
+        self.side = self.get_center_position(image, center)
+        self.position = center[0] / image.shape[1]
 
+    def get_largest_contour(self, mask, image=None, ratio=1):
         contours, _ = cv2.findContours(mask, cv.RETR_TREE, cv.CHAIN_APPROX_NONE)
         contourIdx = self.get_contourIdx(contours)
 
-        cv2.drawContours(image=image, contours=contours, contourIdx=contourIdx, color=(0, 255, 0), thickness=-1)
-        cv2.imshow(self.windowName, image)
+        if contourIdx == -1:
+            return None
+
+        contour = contours[contourIdx]
+
+        if image is not None:
+            # image is the mirrored preview
+            drawn = (contour * ratio).astype(np.int32)
+            drawn[:, :, 0] = image.shape[1] - 1 - drawn[:, :, 0]
+            cv2.drawContours(image=image, contours=[drawn], contourIdx=0, color=(0, 255, 0), thickness=-1)
+
+        return cv2.contourArea(contour), cv2.boundingRect(contour), self.get_contour_center(contour)
+
+    def get_largest_component(self, mask):
+        count, _, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+
+        # label 0 is the background
+        if count < 2:
+            return None
 
-        if contourIdx > -1:
-            self.side = self.get_screen_position(image, contours[contourIdx])
-        else:
-            self.side = Screen.MIDDLE
+        label = 1 + np.argmax(stats[1:, cv2.CC_STAT_AREA])
+        x, y, width, height, area = stats[label]
+        center = [int(centroids[label][0]), int(centroids[label][1])]
+
+        return int(area), (int(x), int(y), int(width), int(height)), center
+
+    def track_camera_object(self, image):
+        x, y, width, height = self.track_window
+
+        # only the search window around the last position is thresholded
+        margin = int(self.track_margin * self.scale)
+        margin_x = width // 2 + margin
+        margin_y = height // 2 + margin
+        x0 = max(x - margin_x, 0)
+        y0 = max(y - margin_y, 0)
+        x1 = min(x + width + margin_x, image.shape[1])
+        y1 = min(y + height + margin_y, image.shape[0])
+
+        mask = self.get_mask(image[y0:y1, x0:x1], self.track_buffers)
+
+        criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 1)
+        box, window = cv2.CamShift(mask, (x - x0, y - y0, width, height), criteria)
+
+        wx, wy, width, height = window
+        if width == 0 or height == 0:
+            self.track_window = None
+            return None
+
+        fill = cv2.countNonZero(mask[wy:wy + height, wx:wx + width]) / (width * height)
+        if fill < self.min_fill:
+            self.track_window = None
+            return None
+
+        self.track_window = (x0 + wx, y0 + wy, width, height)
+
+        return [int(x0 + box[0][0]), int(y0 + box[0][1])]
+
+    @staticmethod
+    def draw_box(image, box):
+        x, y, width, height = box
+        cv2.rectangle(image, (x, y), (x + width, y + height), (0, 255, 0), 2)
 
     def get_contourIdx(self, contours):
 
@@ -294,10 +290,8 @@ class ObjectJoystick:
         y = int(moment["m01"] / moment["m00"])
         return [x, y]
 
-    def get_screen_position(self, image, contour):
+    def get_center_position(self, image, contour_center):
         side = Screen.MIDDLE
-        contour_center = self.get_contour_center(contour)
-
         image_point_o = image.shape[0] / 2
 
         if image_point_o - 25 > contour_center[0]:
@@ -312,7 +306,9 @@ class ObjectJoystick:
 
         if cap.isOpened():
             cap.release()
-            cv2.destroyWindow(self.windowName)
+            self.frame_index = 0
+            self.track_window = None
+            self.preview.close()
 
 
 class Screen(Enum):
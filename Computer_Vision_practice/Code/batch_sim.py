@@ -0,0 +1,196 @@
+"""Many games of Breakout stepped at once as NumPy arrays.
+
+Follows the same rules as breakout_model.GameModel, one game per row, for
+tuning controllers and training autoplay agents without Tk.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from breakout_model import BALL_Y, PADDLE_Y, State, default_bricks
+
+# actions, one per game and step
+LEFT = -1
+CENTER = 0
+RIGHT = 1
+
+
+class BatchBreakout:
+    """N independent games of Breakout.
+
+    step(actions) takes one of LEFT, CENTER or RIGHT per game and returns
+    the State value of every game after the tick. A lost life puts a new
+    ball on the paddle right away, games that are won or over stay put
+    until reset().
+    """
+
+    def __init__(self, games, width=610, height=400, lives=3, bricks=None, paddle_step=15, paddle_width=80,
+                 paddle_height=10, radius=10, speed=5):
+        if bricks is None:
+            bricks = default_bricks(width)
+
+        self.games = games
+        self.width = width
+        self.height = height
+        self.start_lives = lives
+        self.layout = bricks
+        self.paddle_step = paddle_step
+        self.paddle_width = paddle_width
+        self.paddle_height = paddle_height
+        self.radius = radius
+        self.speed = speed
+
+        # most cells the ball can touch along each axis
+        self.window_rows = int(2 * radius // bricks.cell_height) + 2
+        self.window_cols = int(2 * radius // bricks.cell_width) + 2
+
+        self.index = np.arange(games)
+        self.ball_x = np.zeros(games)
+        self.ball_y = np.zeros(games)
+        self.direction_x = np.zeros(games, np.int64)
+        self.direction_y = np.zeros(games, np.int64)
+        self.paddle_x = np.zeros(games)
+        self.lives = np.zeros(games, np.int64)
+        self.hits = np.zeros((games,) + bricks.hits.shape, bricks.hits.dtype)
+        self.remaining = np.zeros(games, np.int64)
+        self.state = np.zeros(games, np.int8)
+        self.reset()
+
+    def reset(self, mask=None):
+        if mask is None:
+            mask = np.ones(self.games, bool)
+
+        self.paddle_x[mask] = self.width / 2
+        self.lives[mask] = self.start_lives
+        self.hits[mask] = self.layout.hits
+        self.remaining[mask] = self.layout.remaining
+        self.state[mask] = State.RUNNING.value
+        self.add_ball(mask)
+
+    def add_ball(self, mask):
+        self.ball_x[mask] = self.paddle_x[mask]
+        self.ball_y[mask] = BALL_Y
+        self.direction_x[mask] = 1
+        self.direction_y[mask] = -1
+
+    def cell_range(self, low, high, origin, size, count):
+        first = np.maximum(np.ceil((low - origin) / size).astype(np.int64) - 1, 0)
+        last = np.minimum(np.floor((high - origin) / size).astype(np.int64), count - 1)
+        return first, last
+
+    def move_paddle(self, actions, running):
+        half = self.paddle_width / 2
+        offset = np.where(running, np.asarray(actions) * self.paddle_step, 0)
+        allowed = (self.paddle_x - half + offset >= 0) & (self.paddle_x + half + offset <= self.width)
+        self.paddle_x += np.where(allowed, offset, 0)
+
+    def check_collisions(self, running):
+        grid = self.layout
+        r = self.radius
+        x0 = self.ball_x - r
+        x1 = self.ball_x + r
+        y0 = self.ball_y - r
+        y1 = self.ball_y + r
+
+        first_row, last_row = self.cell_range(y0, y1, grid.y, grid.cell_height, grid.rows)
+        first_col, last_col = self.cell_range(x0, x1, grid.x, grid.cell_width, grid.cols)
+
+        # number of things touched and the x extent of the last one, which
+        # is all the bounce needs when only one is touched
+        count = np.zeros(self.games, np.int64)
+        box_x0 = np.zeros(self.games)
+        box_x1 = np.zeros(self.games)
+        touched = []
+
+        for row_offset in range(self.window_rows):
+            row = first_row + row_offset
+            for col_offset in range(self.window_cols):
+                col = first_col + col_offset
+                valid = running & (row <= last_row) & (col <= last_col)
+                row_index = np.minimum(row, grid.rows - 1)
+                col_index = np.minimum(col, grid.cols - 1)
+                valid &= self.hits[self.index, row_index, col_index] > 0
+
+                cell_x0 = grid.x + col_index * grid.cell_width
+                count += valid
+                box_x0 = np.where(valid, cell_x0, box_x0)
+                box_x1 = np.where(valid, cell_x0 + grid.cell_width, box_x1)
+                touched.append((valid, row_index, col_index))
+
+        half_width = self.paddle_width / 2
+        half_height = self.paddle_height / 2
+        paddle = running & (x0 <= self.paddle_x + half_width) & (self.paddle_x - half_width <= x1) & \
+            (y0 <= PADDLE_Y + half_height) & (PADDLE_Y - half_height <= y1)
+        count += paddle
+        box_x0 = np.where(paddle, self.paddle_x - half_width, box_x0)
+        box_x1 = np.where(paddle, self.paddle_x + half_width, box_x1)
+
+        single = count == 1
+        bounce_y = (count > 1) | (single & (self.ball_x >= box_x0) & (self.ball_x <= box_x1))
+        self.direction_x[single & (self.ball_x > box_x1)] = 1
+        self.direction_x[single & (self.ball_x < box_x0)] = -1
+        self.direction_y[bounce_y] *= -1
+
+        for valid, row_index, col_index in touched:
+            games = self.index[valid]
+            rows = row_index[valid]
+            cols = col_index[valid]
+            self.hits[games, rows, cols] -= 1
+            self.remaining[games] -= self.hits[games, rows, cols] == 0
+
+    def update_balls(self, moving):
+        r = self.radius
+        bounce_x = moving & ((self.ball_x - r <= 0) | (self.ball_x + r >= self.width))
+        bounce_y = moving & (self.ball_y - r <= 0)
+        self.direction_x[bounce_x] *= -1
+        self.direction_y[bounce_y] *= -1
+        self.ball_x += np.where(moving, self.direction_x * self.speed, 0)
+        self.ball_y += np.where(moving, self.direction_y * self.speed, 0)
+
+    def step(self, actions):
+        running = self.state == State.RUNNING.value
+
+        self.move_paddle(actions, running)
+        self.check_collisions(running)
+
+        won = running & (self.remaining == 0)
+        lost = running & ~won & (self.ball_y + self.radius >= self.height)
+        self.lives[lost] -= 1
+        over = lost & (self.lives < 0)
+        respawn = lost & ~over
+
+        self.update_balls(running & ~won & ~lost)
+
+        self.state[won] = State.WON.value
+        self.state[over] = State.GAME_OVER.value
+        result = self.state.copy()
+        result[respawn] = State.LOST_LIFE.value
+
+        self.add_ball(respawn)
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Step random games and report the simulation throughput.')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--steps', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    batch = BatchBreakout(args.games)
+    actions = rng.integers(LEFT, RIGHT + 1, (args.steps, args.games))
+
+    start = time.perf_counter()
+    for step_actions in actions:
+        batch.step(step_actions)
+    total = time.perf_counter() - start
+
+    print('{:.0f} ticks/s, {} won, {} over'.format(args.games * args.steps / total,
+                                                  np.count_nonzero(batch.state == State.WON.value),
+                                                  np.count_nonzero(batch.state == State.GAME_OVER.value)))
+
+
+if __name__ == '__main__':
+    main()
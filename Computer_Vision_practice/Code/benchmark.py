@@ -0,0 +1,272 @@
+import argparse
+import ctypes
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+import cv2
+import numpy as np
+
+from EDJD_IVC_2223_TP2_17010_23155 import MoveJoystick
+from EDJD_IVC_2223_TP3_17010_23155 import FaceJoystick
+from EDJD_IVC_2223_TPI_17010_23155 import ObjectJoystick
+from frame_capture import FrameSlot
+from frame_sources import FaceImageSource, MovingDiscSource, TexturedPatchSource, create_source
+
+RESOLUTIONS = [(320, 240), (640, 480), (1280, 720), (1920, 1080)]
+
+# how to build each controller headless and run it on one frame
+CONTROLLERS = {
+    'object': (lambda: ObjectJoystick(preview='headless'), lambda joystick: joystick.detect_camera_object()),
+    'move': (lambda: MoveJoystick(preview='headless'), lambda joystick: joystick.on_move_detection),
+    'move_difference': (lambda: MoveJoystick(engine='difference', preview='headless'),
+                        lambda joystick: joystick.on_move_detection),
+    'face': (lambda: FaceJoystick(preview='headless'), lambda joystick: joystick.face_on_detection),
+}
+
+
+class ClipCapture(FrameSlot):
+    # hands out a preloaded clip frame by frame, so decoding is not
+    # measured and every run sees the same input
+
+    def __init__(self, frames):
+        super(ClipCapture, self).__init__()
+        self.frames = frames
+        self.index = 0
+
+    def read_latest(self):
+        frame = self.frames[self.index % len(self.frames)]
+        self.index += 1
+        self.put(frame, float(self.index), self.index)
+        return self.slot
+
+
+class ProcessMemoryCounters(ctypes.Structure):
+    _fields_ = [('cb', ctypes.c_uint32), ('PageFaultCount', ctypes.c_uint32),
+                ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+
+def peak_rss():
+    # highest resident memory of this process so far in bytes, native
+    # OpenCV allocations included
+    if os.path.exists('/proc/self/status'):
+        # Linux, where reset_peak_rss() can restart it
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb)
+    return counters.PeakWorkingSetSize
+
+
+def reset_peak_rss():
+    # only Linux can lower the peak back to the current resident memory
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+    except OSError:
+        pass
+
+
+def get_clip_library(clip_paths, face_image=None):
+    # name -> function(width, height) returning an unpaced frame source
+    library = {
+        'disc': lambda width, height: MovingDiscSource(width=width, height=height, realtime=False),
+        'patch': lambda width, height: TexturedPatchSource(width=width, height=height, realtime=False),
+    }
+
+    if face_image is not None:
+        library['face'] = lambda width, height: FaceImageSource(face_image, width=width, height=height,
+                                                                realtime=False)
+
+    for path in clip_paths:
+        def open_clip(width, height, path=path):
+            source = create_source(path)
+            source.realtime = False
+            return source
+
+        library[os.path.splitext(os.path.basename(path.rstrip('/')))[0]] = open_clip
+
+    return library
+
+
+def load_clip(source, width, height, count):
+    source.open()
+    frames = []
+
+    while len(frames) < count:
+        ret, frame = source.read()
+        if not ret:
+            break
+        if frame.shape[1] != width or frame.shape[0] != height:
+            frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        frames.append(frame)
+
+    source.release()
+    return frames
+
+
+def run_controller(name, frames, warmup=5):
+    create, step = CONTROLLERS[name]
+
+    joystick = create()
+    joystick.cap = ClipCapture(frames)
+    joystick.open_window()
+
+    for _ in range(warmup):
+        step(joystick)
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(len(frames)):
+        frame_start = time.perf_counter()
+        step(joystick)
+        latencies.append(time.perf_counter() - frame_start)
+    total = time.perf_counter() - start
+
+    latencies = np.array(latencies) * 1000
+    return {
+        'frames': len(frames),
+        'fps': len(frames) / total,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+    }
+
+
+def memory_worker(name, clips, face_image, clip_name, width, height, count, results, warmup=5):
+    # runs in a fresh process, so its peak belongs to this controller alone
+    open_clip = get_clip_library(clips, face_image)[clip_name]
+    frames = load_clip(open_clip(width, height), width, height, count)
+    reset_peak_rss()
+
+    create, step = CONTROLLERS[name]
+    joystick = create()
+    joystick.cap = ClipCapture(frames)
+    joystick.open_window()
+    for _ in range(warmup + len(frames)):
+        step(joystick)
+
+    results.put(peak_rss())
+
+
+def measure_memory(name, clips, face_image, clip_name, width, height, count):
+    """Peak memory of a controller playing a clip, measured in its own process.
+
+    Returns the peak resident memory of that process in MB. It includes the
+    interpreter and the loaded clip, which are the same for every controller.
+    On Linux the peak restarts once the clip is loaded, elsewhere whatever
+    loading it took stays in.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=memory_worker,
+                              args=(name, clips, face_image, clip_name, width, height, count, results))
+    process.start()
+    peak = results.get()
+    process.join()
+    return peak / 2 ** 20
+
+
+def run_benchmarks(controllers, library, resolutions, count, clips=(), face_image=None):
+    results = {}
+
+    for clip_name, open_clip in library.items():
+        for width, height in resolutions:
+            frames = load_clip(open_clip(width, height), width, height, count)
+            if len(frames) == 0:
+                continue
+
+            for controller in controllers:
+                key = '{}/{}/{}x{}'.format(controller, clip_name, width, height)
+                results[key] = run_controller(controller, frames)
+                results[key]['clip_mb'] = sum(frame.nbytes for frame in frames) / 2 ** 20
+                results[key]['peak_memory_mb'] = measure_memory(controller, clips, face_image, clip_name,
+                                                                width, height, count)
+                print('{:<32} {fps:8.1f} fps  p50 {p50_ms:7.2f} ms  p95 {p95_ms:7.2f} ms  '
+                      'p99 {p99_ms:7.2f} ms  peak {peak_memory_mb:7.1f} MB'.format(key, **results[key]))
+
+    return results
+
+
+def compare_results(results, baseline, tolerance):
+    regressions = []
+
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+
+        expected = baseline[key]['fps']
+        if result['fps'] < expected * (1 - tolerance):
+            regressions.append((key, expected, result['fps']))
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay clips through the joysticks and time them.')
+    parser.add_argument('clips', nargs='*', help='video files or directories of frames')
+    parser.add_argument('--controllers', default=','.join(CONTROLLERS))
+    parser.add_argument('--resolutions', default=','.join('{}x{}'.format(*size) for size in RESOLUTIONS))
+    parser.add_argument('--frames', type=int, default=150)
+    parser.add_argument('--face-image', help='face picture for the synthetic face clip')
+    parser.add_argument('--output', help='save the results as a JSON baseline')
+    parser.add_argument('--baseline', help='flag throughput regressions against this JSON baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15)
+    args = parser.parse_args(argv)
+
+    controllers = args.controllers.split(',')
+    resolutions = [tuple(int(value) for value in size.split('x')) for size in args.resolutions.split(',')]
+    library = get_clip_library(args.clips, args.face_image)
+
+    results = run_benchmarks(controllers, library, resolutions, args.frames, args.clips, args.face_image)
+
+    if args.output:
+        report = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'results': results,
+        }
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+
+        regressions = compare_results(results, baseline, args.tolerance)
+        for key, expected, measured in regressions:
+            print('REGRESSION {}: {:.1f} fps, baseline {:.1f} fps'.format(key, measured, expected))
+
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
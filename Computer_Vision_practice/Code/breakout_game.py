@@ -0,0 +1,297 @@
+"""Tk front end of Breakout, shared by the three joystick scripts.
+
+Each script subclasses Game with its own joystick, paddle step and Screen
+enum. The canvas only draws the GameModel, which runs in fixed steps while
+the joystick detects on its own thread.
+"""
+import tkinter as tk
+
+from breakout_model import GameModel, State
+from frame_capture import get_screen
+from game_clock import AsyncVision, FixedTimestep, wait_for_frame
+from instrumentation import PROFILER
+from kalman import KalmanPredictor
+from paddle_control import PaddleControl
+from preview import flush_preview
+from quality import QualityGovernor
+from session_log import SessionRecorder
+from vision_worker import VisionWorker, run_detection
+
+
+class GameObject(object):
+    # draws one object of the GameModel on the canvas
+    def __init__(self, canvas, item, model):
+        self.canvas = canvas
+        self.item = item
+        self.model = model
+
+    def draw(self):
+        self.canvas.coords(self.item, *self.model.get_position())
+
+    def delete(self):
+        self.canvas.delete(self.item)
+
+
+class Ball(GameObject):
+    def __init__(self, canvas, model):
+        item = canvas.create_oval(*model.get_position(), fill='white')
+        super(Ball, self).__init__(canvas, item, model)
+
+
+class Paddle(GameObject):
+    def __init__(self, canvas, model):
+        item = canvas.create_rectangle(*model.get_position(), fill='#FFB643')
+        super(Paddle, self).__init__(canvas, item, model)
+
+
+class Brick(GameObject):
+    COLORS = {1: '#4535AA', 2: '#ED639E', 3: '#8FE1A2'}
+
+    def __init__(self, canvas, grid, cell):
+        self.cell = cell
+        color = Brick.COLORS[grid.hits[cell]]
+        item = canvas.create_rectangle(*grid.get_position(cell), fill=color, tags='brick')
+        super(Brick, self).__init__(canvas, item, grid)
+
+    def draw(self):
+        hits = self.model.hits[self.cell]
+        if hits == 0:
+            self.delete()
+        else:
+            self.canvas.itemconfig(self.item, fill=Brick.COLORS[hits])
+
+
+class Game(tk.Frame):
+    """One game of Breakout played with a joystick.
+
+    create(**options) builds the joystick and detect names the method or
+    property that runs it on the newest frame. screen is the script's Screen
+    enum and step the pixels the paddle moves per step towards the side.
+    """
+
+    def __init__(self, master, create, detect, screen, step, options=None, control='proportional', predict=False,
+                 worker=False, quality=False, record=None, joystick=None):
+        super(Game, self).__init__(master)
+        if options is None:
+            options = {}
+
+        self.width = 610
+        self.height = 400
+        self.canvas = tk.Canvas(self, bg='#D6D1F5',
+                                width=self.width,
+                                height=self.height, )
+        self.canvas.pack()
+        self.pack()
+
+        # the model plays the game, the canvas only shows it
+        self.model = GameModel(self.width, self.height)
+        self.ball = None
+        self.paddle = Paddle(self.canvas, self.model.paddle)
+        self.bricks = {}
+        for cell in self.model.bricks.cells():
+            self.bricks[cell] = Brick(self.canvas, self.model.bricks, cell)
+
+        # worker=True runs the joystick in its own process, quality=True lets
+        # a QualityGovernor trade detection quality for time (in process only)
+        # and joystick replaces the script's own, e.g. with a HybridJoystick
+        self.screen = screen
+        self.step = step
+        self.detect = detect
+        self.quality = None
+        if joystick is not None:
+            self.joystick = joystick
+        elif worker:
+            self.joystick = VisionWorker(create, detect, screen, **options)
+        else:
+            self.quality = QualityGovernor() if quality else None
+            self.joystick = create(quality=self.quality, **options)
+
+        # physics runs in fixed 50 ms steps whatever the detection costs,
+        # the detection runs on its own thread and the loop takes its latest side
+        self.clock = FixedTimestep(0.05)
+        # control='proportional' puts the paddle where the player is,
+        # control='step' moves it by a fixed step towards their side,
+        # predict=True makes up for the vision latency with a Kalman filter
+        predictor = KalmanPredictor() if predict else None
+        self.control = PaddleControl(control, predictor=predictor)
+        self.vision = AsyncVision(self.read_vision, get_screen(screen, 'CENTER'))
+        # record='session.ivc' logs every step for session_log.py to replay,
+        # with the number of the loop it ran in
+        self.recorder = SessionRecorder(record, self.model, step) if record else None
+        self.loops = 0
+
+        self.hud = None
+        self.setup_game()
+        self.canvas.focus_set()
+
+        # IVC_PROFILE=1 shows the stage timings on the canvas, P dumps them
+        # (with quality=True the tier is shown and P writes quality.json either way)
+        self.profiler = PROFILER
+        self.profile_text = None
+        self.ticks = 0
+        self.canvas.bind('<Key-p>', lambda _: self.dump_profile())
+
+        # the camera stays open between lives and is only released here
+        # or when the game is over
+        master.protocol('WM_DELETE_WINDOW', self.close)
+        # self.canvas.bind('<Left>', lambda _: self.model.paddle.move(-10, self.width))
+        # self.canvas.bind('<Right>', lambda _: self.model.paddle.move(10, self.width))
+
+    def setup_game(self):
+        self.joystick.pause()
+        self.add_ball()
+        self.update_lives_text()
+        self.text = self.draw_text(300, 200,
+                                   'Click mouse to start')
+        self.canvas.bind('<Button-1>', lambda _: self.start_game())
+
+    def add_ball(self):
+        if self.ball is not None:
+            self.ball.delete()
+        self.model.add_ball()
+        self.ball = Ball(self.canvas, self.model.ball)
+
+    def draw_text(self, x, y, text, size='40'):
+        font = ('Forte', size)
+        return self.canvas.create_text(x, y, text=text,
+                                       font=font)
+
+    def update_lives_text(self):
+        text = 'Lives: %s' % self.model.lives
+        if self.hud is None:
+            self.hud = self.draw_text(50, 20, text, 15)
+        else:
+            self.canvas.itemconfig(self.hud, text=text)
+
+    def start_game(self):
+        self.joystick.open_window()
+
+        self.canvas.unbind('<Button-1>')
+        self.canvas.delete(self.text)
+        self.model.start()
+        self.control.reset()
+        self.vision.start()
+        self.clock.reset()
+        self.game_loop()
+
+    def read_vision(self):
+        # runs on the vision thread
+        wait_for_frame(self.joystick)
+        with self.profiler.span('game.vision'):
+            run_detection(self.joystick, self.detect)
+        return self.joystick.side
+
+    def game_loop(self):
+        profiler = self.profiler
+
+        # the camera window is shown from the Tk thread, HighGUI is not thread-safe
+        flush_preview(self.joystick)
+
+        if self.vision.error is not None:
+            self.vision_failed()
+            return
+
+        steps = self.clock.advance()
+        if steps == 0:
+            # woke up before the next step was due, there is nothing to update
+            self.after(self.clock.delay(), self.game_loop)
+            return
+
+        self.loops += 1
+        screen_side = self.vision.side
+
+        side_offset = 0
+        if screen_side == self.screen.LEFT:
+            side_offset = -self.step
+        elif screen_side == self.screen.RIGHT:
+            side_offset = self.step
+
+        position = self.joystick.position
+        frame_index = self.joystick.frame_index
+        frame_time = self.joystick.frame_time
+        self.control.update(position, frame_time)
+
+        state = State.RUNNING
+        with profiler.span('game.step'):
+            for _ in range(steps):
+                offset = self.control.offset(self.model.paddle, self.width, side_offset)
+                state = self.model.step(offset)
+                if self.recorder is not None:
+                    self.recorder.record(self.model, state, offset, side_offset, position, self.loops,
+                                         frame_index, frame_time)
+                if state != State.RUNNING:
+                    break
+        with profiler.span('game.render'):
+            self.render()
+
+        if state != State.RUNNING:
+            self.vision.stop()
+        if state in (State.WON, State.GAME_OVER):
+            self.stop_recording()
+
+        if state == State.WON:
+            self.joystick.destroy_window()
+            self.draw_text(300, 200, 'You win! You the Breaker of Bricks.')
+        elif state == State.GAME_OVER:
+            self.joystick.destroy_window()
+            self.draw_text(300, 200, 'You Lose! Game Over!')
+        elif state == State.LOST_LIFE:
+            self.after(1000, self.setup_game)
+        else:
+            self.update_profile_text()
+            self.after(self.clock.delay(), self.game_loop)
+
+    def vision_failed(self):
+        # the game stops rather than play on the last side, and the error is
+        # raised again here so Tk prints it
+        error = self.vision.error
+        self.vision.stop()
+        self.stop_recording()
+        self.joystick.destroy_window()
+        self.draw_text(300, 200, 'The camera control failed', 20)
+        raise error
+
+    def render(self):
+        self.paddle.draw()
+        self.ball.draw()
+        for cell in self.model.pop_hits():
+            self.bricks[cell].draw()
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def close(self):
+        self.vision.stop()
+        self.stop_recording()
+        self.joystick.destroy_window()
+        self.master.destroy()
+
+    def update_profile_text(self):
+        self.ticks += 1
+        if self.ticks % 20 != 0:
+            return
+
+        # the quality tier is shown whenever a governor runs, profiled or not
+        lines = []
+        if self.profiler.enabled:
+            lines.append(self.profiler.overlay_text())
+        if self.quality is not None:
+            lines.append('quality: %s' % self.quality.current['name'])
+        if not lines:
+            return
+
+        text = '\n'.join(lines)
+        if self.profile_text is None:
+            self.profile_text = self.canvas.create_text(self.width - 5, 5, text=text, anchor='ne',
+                                                        font=('Courier', 8))
+        else:
+            self.canvas.itemconfig(self.profile_text, text=text)
+
+    def dump_profile(self):
+        if self.profiler.enabled:
+            self.profiler.dump_json('profile.json')
+            self.profiler.dump_csv('profile.csv')
+        if self.quality is not None:
+            self.quality.dump_json('quality.json')
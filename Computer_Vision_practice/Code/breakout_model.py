@@ -0,0 +1,222 @@
+"""Breakout game state and rules, kept apart from Tk.
+
+The Tk games only draw a GameModel, so the same simulation runs headless
+for tests and replays at thousands of ticks per second.
+"""
+import math
+from enum import Enum
+
+import numpy as np
+
+from instrumentation import get_profiler
+
+# heights of the paddle and of a new ball on top of it
+PADDLE_Y = 326
+BALL_Y = 310
+
+
+class State(Enum):
+    RUNNING = 0
+    WON = 1
+    LOST_LIFE = 2
+    GAME_OVER = 3
+
+
+def overlaps(a, b):
+    # same rule as canvas.find_overlapping, touching boxes overlap
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class BoxModel(object):
+    def __init__(self, x, y, width, height):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+    def get_position(self):
+        return [self.x - self.width / 2, self.y - self.height / 2,
+                self.x + self.width / 2, self.y + self.height / 2]
+
+    def move(self, x, y):
+        self.x += x
+        self.y += y
+
+
+class BallModel(BoxModel):
+    def __init__(self, x, y, radius=10, speed=5):
+        super(BallModel, self).__init__(x, y, 2 * radius, 2 * radius)
+        self.radius = radius
+        self.direction = [1, -1]
+        # increase speed to make the ball faster
+        self.speed = speed
+
+    def update(self, width):
+        coords = self.get_position()
+        if coords[0] <= 0 or coords[2] >= width:
+            self.direction[0] *= -1
+        if coords[1] <= 0:
+            self.direction[1] *= -1
+        self.move(self.direction[0] * self.speed, self.direction[1] * self.speed)
+
+    def collide(self, boxes):
+        # boxes of everything the ball touches, as [x0, y0, x1, y1]
+        if len(boxes) > 1:
+            self.direction[1] *= -1
+        elif len(boxes) == 1:
+            coords = boxes[0]
+            if self.x > coords[2]:
+                self.direction[0] = 1
+            elif self.x < coords[0]:
+                self.direction[0] = -1
+            else:
+                self.direction[1] *= -1
+
+
+class PaddleModel(BoxModel):
+    def __init__(self, x, y, width=80, height=10):
+        super(PaddleModel, self).__init__(x, y, width, height)
+        self.ball = None
+
+    def move(self, offset, width):
+        coords = self.get_position()
+        if coords[0] + offset >= 0 and coords[2] + offset <= width:
+            super(PaddleModel, self).move(offset, 0)
+            if self.ball is not None:
+                self.ball.move(offset, 0)
+
+
+class BrickGrid:
+    """Bricks on a regular grid, stored as the hits left in each cell.
+
+    The cells under the ball are found from its box directly, so a
+    collision check costs the same however many bricks the level has.
+    `remaining` counts the cells with hits left.
+    """
+
+    def __init__(self, hits, x=5, y=40, cell_width=75, cell_height=20):
+        self.hits = np.array(hits, dtype=np.int16)
+        self.x = x
+        self.y = y
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.remaining = int(np.count_nonzero(self.hits))
+
+    @property
+    def rows(self):
+        return self.hits.shape[0]
+
+    @property
+    def cols(self):
+        return self.hits.shape[1]
+
+    def cells(self):
+        return [(int(row), int(col)) for row, col in zip(*np.nonzero(self.hits))]
+
+    def get_position(self, cell):
+        row, col = cell
+        x = self.x + col * self.cell_width
+        y = self.y + row * self.cell_height
+        return [x, y, x + self.cell_width, y + self.cell_height]
+
+    def cell_range(self, low, high, origin, size, count):
+        # cells whose closed interval touches [low, high]
+        first = max(math.ceil((low - origin) / size) - 1, 0)
+        last = min(math.floor((high - origin) / size), count - 1)
+        return range(first, last + 1)
+
+    def overlapping(self, box):
+        rows = self.cell_range(box[1], box[3], self.y, self.cell_height, self.rows)
+        cols = self.cell_range(box[0], box[2], self.x, self.cell_width, self.cols)
+        return [(row, col) for row in rows for col in cols if self.hits[row, col] > 0]
+
+    def hit(self, cell):
+        self.hits[cell] -= 1
+        if self.hits[cell] == 0:
+            self.remaining -= 1
+
+
+def default_bricks(width):
+    # rows of bricks with different hit capacities - 3,2 and 1
+    cols = (width - 10) // 75
+    return BrickGrid([[3] * cols, [2] * cols, [1] * cols])
+
+
+def random_bricks(rows, cols, max_hits=3, fill=0.8, seed=None, **kwargs):
+    # procedurally generated level, cells are empty with chance 1 - fill
+    rng = np.random.default_rng(seed)
+    hits = rng.integers(1, max_hits + 1, (rows, cols))
+    hits[rng.random((rows, cols)) >= fill] = 0
+    return BrickGrid(hits, **kwargs)
+
+
+class GameModel:
+    """Ball, paddle, bricks and lives of one game of Breakout.
+
+    step(offset) moves the paddle by offset pixels and advances the game by
+    one tick. The cells of the bricks hit since the last pop_hits() are
+    kept in `hits`, so a renderer only redraws what changed. The collision
+    check and the ball update are timed as the 'game.collisions' and
+    'game.ball' spans of the profiler.
+    """
+
+    def __init__(self, width=610, height=400, lives=3, bricks=None, profiler=None):
+        if bricks is None:
+            bricks = default_bricks(width)
+
+        self.width = width
+        self.height = height
+        self.lives = lives
+        self.paddle = PaddleModel(width / 2, PADDLE_Y)
+        self.ball = None
+        self.bricks = bricks
+        self.hits = []
+        self.profiler = get_profiler(profiler, 'game')
+        self.add_ball()
+
+    def add_ball(self):
+        self.ball = BallModel(self.paddle.x, BALL_Y)
+        self.paddle.ball = self.ball
+
+    def start(self):
+        self.paddle.ball = None
+
+    def check_collisions(self):
+        ball_coords = self.ball.get_position()
+        cells = self.bricks.overlapping(ball_coords)
+        boxes = [self.bricks.get_position(cell) for cell in cells]
+        paddle_coords = self.paddle.get_position()
+        if overlaps(ball_coords, paddle_coords):
+            boxes.insert(0, paddle_coords)
+
+        self.ball.collide(boxes)
+
+        for cell in cells:
+            self.bricks.hit(cell)
+            self.hits.append(cell)
+
+    def pop_hits(self):
+        hits = self.hits
+        self.hits = []
+        return hits
+
+    def step(self, offset=0):
+        profiler = self.profiler
+        self.paddle.move(offset, self.width)
+        with profiler.span('collisions'):
+            self.check_collisions()
+
+        if self.bricks.remaining == 0:
+            self.ball.speed = None
+            return State.WON
+
+        if self.ball.get_position()[3] >= self.height:
+            self.ball.speed = None
+            self.lives -= 1
+            if self.lives < 0:
+                return State.GAME_OVER
+            return State.LOST_LIFE
+
+        with profiler.span('ball'):
+            self.ball.update(self.width)
+        return State.RUNNING
@@ -0,0 +1,80 @@
+import os
+
+import cv2
+import numpy as np
+
+LUT_CACHE_DIR = os.environ.get('IVC_LUT_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'ivc'))
+
+
+def build_mask_lut(lower, upper, bits=8):
+    # every quantised colour laid out as one image, ordered r, g, b so the
+    # flat position matches a little-endian BGRA pixel read as uint32
+    levels = 1 << bits
+    step = 256 // levels
+    values = (np.arange(levels) * step + step // 2).astype(np.uint8)
+
+    r, g, b = np.meshgrid(values, values, values, indexing='ij')
+    bgr = np.stack([b, g, r], axis=-1).reshape(levels * levels, levels, 3)
+
+    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+    return cv2.inRange(hsv, np.array(lower), np.array(upper)).ravel()
+
+
+def expand_mask_lut(lut, bits):
+    # repeat every quantised entry so any 24-bit colour indexes it directly
+    if bits == 8:
+        return lut
+
+    levels = 1 << bits
+    step = 256 // levels
+    lut = lut.reshape(levels, levels, levels)
+    for axis in range(3):
+        lut = np.repeat(lut, step, axis=axis)
+
+    return lut.ravel()
+
+
+def get_lut_path(lower, upper, bits):
+    name = 'mask_lut_{}_{}_{}.npy'.format('-'.join(map(str, lower)), '-'.join(map(str, upper)), bits)
+    return os.path.join(LUT_CACHE_DIR, name)
+
+
+def load_mask_lut(lower, upper, bits=8):
+    lower = [int(value) for value in lower]
+    upper = [int(value) for value in upper]
+    path = get_lut_path(lower, upper, bits)
+
+    # stored one bit per entry, 2 MB for the full 24-bit table
+    if os.path.exists(path):
+        lut = np.unpackbits(np.load(path)) * np.uint8(255)
+    else:
+        lut = build_mask_lut(lower, upper, bits)
+
+        try:
+            os.makedirs(LUT_CACHE_DIR, exist_ok=True)
+            np.save(path, np.packbits(lut > 0))
+        except OSError:
+            pass
+
+    return expand_mask_lut(lut, bits)
+
+
+class MaskLookup:
+    """Replaces cvtColor(BGR2HSV) + inRange with one table lookup."""
+
+    def __init__(self, lower, upper, bits=8):
+        self.lut = load_mask_lut(lower, upper, bits)
+        self.bgra = None
+        self.mask = None
+
+    def apply(self, image):
+        if self.bgra is None or self.bgra.shape[:2] != image.shape[:2]:
+            self.bgra = np.empty(image.shape[:2] + (4,), np.uint8)
+            self.mask = np.empty(image.shape[:2], np.uint8)
+
+        # the padded pixel read as one uint32 is the table index
+        cv2.cvtColor(image, cv2.COLOR_BGR2BGRA, dst=self.bgra)
+        index = self.bgra.view(np.uint32)[:, :, 0]
+        index &= 0xFFFFFF
+
+        return np.take(self.lut, index, out=self.mask)
@@ -0,0 +1,138 @@
+import threading
+import time
+
+from frame_sources import create_source
+
+
+class FrameCapture:
+    """Owns a frame source and keeps only the freshest frame.
+
+    The source is a camera index, a video file, a directory of frames or
+    any object from frame_sources. A daemon thread reads it as fast as it
+    delivers frames and overwrites a single slot with (frame, timestamp,
+    index). Publishing the slot is one tuple assignment, so readers never
+    take a lock and never wait on camera I/O once the first frame arrived.
+    """
+
+    def __init__(self, source=0, first_frame_timeout=2.0):
+        self.cap = create_source(source)
+        self.first_frame_timeout = first_frame_timeout
+        self.slot = (None, 0.0, 0)
+        self.thread = None
+        self.running = False
+        self.paused = False
+        self.first_frame = threading.Event()
+        self.new_frame = threading.Condition()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def open(self):
+        if not self.cap.isOpened():
+            self.cap.open()
+        if self.cap.isOpened() and self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self.capture_loop, daemon=True)
+            self.thread.start()
+        return self.cap.isOpened()
+
+    def capture_loop(self):
+        index = self.slot[2]
+        while self.running:
+            if self.paused:
+                self.idle()
+                continue
+
+            ret, frame = self.cap.read()
+            if not ret:
+                time.sleep(0.005)
+                continue
+            index += 1
+            self.slot = (frame, time.monotonic(), index)
+            self.first_frame.set()
+            with self.new_frame:
+                self.new_frame.notify_all()
+
+    def idle(self):
+        # cameras keep grabbing without decoding, so exposure stays settled
+        # and resuming needs no re-open
+        grab = getattr(self.cap, 'grab', None)
+        if grab is not None:
+            grab()
+        else:
+            time.sleep(0.01)
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+    def read_latest(self):
+        # only the very first call may block, until the camera delivers
+        if self.slot[0] is None:
+            self.first_frame.wait(self.first_frame_timeout)
+        return self.slot
+
+    def wait_for_frame(self, index, timeout=None):
+        # for readers on their own thread, wakes up once a frame newer than
+        # index is in the slot
+        with self.new_frame:
+            return self.new_frame.wait_for(lambda: self.slot[2] != index, timeout)
+
+    def read(self):
+        frame, _, _ = self.read_latest()
+        return frame is not None, frame
+
+    def release(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.cap.release()
+        self.slot = (None, 0.0, 0)
+        self.paused = False
+        self.first_frame.clear()
+
+
+class FrameSlot:
+    """Stands in for a FrameCapture and hands out the frame put() in it.
+
+    Joysticks read it like their capture, so a caller that already holds
+    the frame (the hybrid, the vision worker, the benchmark) runs them on
+    exactly that frame.
+    """
+
+    def __init__(self):
+        self.slot = (None, 0.0, 0)
+
+    def put(self, frame, frame_time, frame_index):
+        self.slot = (frame, frame_time, frame_index)
+
+    def isOpened(self):
+        return True
+
+    def open(self):
+        return True
+
+    def read_latest(self):
+        return self.slot
+
+    def read(self):
+        return self.slot[0] is not None, self.slot[0]
+
+    def release(self):
+        self.slot = (None, 0.0, 0)
+
+    def pause(self):
+        pass
+
+    def resume(self):
+        pass
+
+
+def get_screen(screen, name):
+    # the colour game calls the middle MIDDLE, the other scripts CENTER
+    if name not in screen.__members__:
+        name = 'MIDDLE'
+    return screen[name]
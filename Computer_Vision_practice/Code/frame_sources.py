@@ -0,0 +1,245 @@
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+class Pacer:
+    # sleeps so that frames come out at most at the given rate
+
+    def __init__(self, fps):
+        self.period = 1.0 / fps if fps else 0.0
+        self.next_time = 0.0
+
+    def wait(self):
+        if self.period == 0.0:
+            return
+
+        now = time.monotonic()
+        if now < self.next_time:
+            time.sleep(self.next_time - now)
+            now = self.next_time
+        self.next_time = max(self.next_time + self.period, now)
+
+
+class CameraSource:
+
+    def __init__(self, index=0, width=None, height=None, fps=None):
+        self.index = index
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.cap = cv2.VideoCapture()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def open(self):
+        if not self.cap.open(self.index):
+            return False
+
+        if self.width is not None:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        if self.height is not None:
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        if self.fps is not None:
+            self.cap.set(cv2.CAP_PROP_FPS, self.fps)
+
+        return True
+
+    def read(self):
+        return self.cap.read()
+
+    def grab(self):
+        return self.cap.grab()
+
+    def release(self):
+        self.cap.release()
+
+
+class VideoFileSource:
+
+    def __init__(self, path, loop=True, realtime=True):
+        self.path = path
+        self.loop = loop
+        self.realtime = realtime
+        self.cap = cv2.VideoCapture()
+        self.pacer = None
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def open(self):
+        if not self.cap.open(self.path):
+            return False
+
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if self.realtime else 0
+        self.pacer = Pacer(fps)
+        return True
+
+    def read(self):
+        self.pacer.wait()
+        ret, frame = self.cap.read()
+
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+
+        return ret, frame
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageSequenceSource:
+
+    def __init__(self, directory, fps=30, loop=True, realtime=True):
+        self.directory = directory
+        self.fps = fps
+        self.loop = loop
+        self.realtime = realtime
+        self.paths = []
+        self.index = 0
+        self.pacer = None
+
+    def isOpened(self):
+        return len(self.paths) > 0
+
+    def open(self):
+        paths = sorted(glob.glob(os.path.join(self.directory, '*')))
+        self.paths = [path for path in paths if path.lower().endswith(IMAGE_EXTENSIONS)]
+        self.index = 0
+        self.pacer = Pacer(self.fps if self.realtime else 0)
+        return self.isOpened()
+
+    def read(self):
+        if self.index == len(self.paths):
+            if not self.loop:
+                return False, None
+            self.index = 0
+
+        self.pacer.wait()
+        frame = cv2.imread(self.paths[self.index])
+        self.index += 1
+
+        return frame is not None, frame
+
+    def release(self):
+        self.paths = []
+
+
+class SyntheticSource:
+    # subclasses draw frame number index with render(index, phase), where
+    # phase runs from 0 to 1 once per period seconds of video
+
+    def __init__(self, width=640, height=480, fps=30, frames=None, period=4.0, realtime=True):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frames = frames
+        self.period = period
+        self.realtime = realtime
+        self.index = 0
+        self.opened = False
+        self.pacer = None
+
+    def isOpened(self):
+        return self.opened
+
+    def open(self):
+        self.index = 0
+        self.opened = True
+        self.pacer = Pacer(self.fps if self.realtime else 0)
+        return True
+
+    def read(self):
+        if self.frames is not None and self.index >= self.frames:
+            return False, None
+
+        self.pacer.wait()
+        phase = (self.index / self.fps / self.period) % 1.0
+        frame = self.render(self.index, phase)
+        self.index += 1
+
+        return True, frame
+
+    def release(self):
+        self.opened = False
+
+    def background(self):
+        return np.full((self.height, self.width, 3), 200, np.uint8)
+
+    def swing(self, phase, size):
+        # x of the left edge of an object of the given width swinging
+        # from side to side across the frame
+        travel = self.width - size
+        return int(travel * (0.5 - 0.5 * np.cos(2 * np.pi * phase)))
+
+    def render(self, index, phase):
+        raise NotImplementedError
+
+
+class MovingDiscSource(SyntheticSource):
+
+    def __init__(self, color=(255, 0, 0), **kwargs):
+        super(MovingDiscSource, self).__init__(**kwargs)
+        self.color = color
+        self.radius = self.height // 8
+
+    def render(self, index, phase):
+        frame = self.background()
+        x = self.swing(phase, 2 * self.radius) + self.radius
+        cv2.circle(frame, (x, self.height // 2), self.radius, self.color, -1)
+        return frame
+
+
+class TexturedPatchSource(SyntheticSource):
+
+    def __init__(self, seed=0, **kwargs):
+        super(TexturedPatchSource, self).__init__(**kwargs)
+        size = self.height // 2
+        noise = np.random.default_rng(seed).integers(0, 256, (size // 8, size // 8, 3), dtype=np.uint8)
+        self.patch = cv2.resize(noise, (size, size), interpolation=cv2.INTER_NEAREST)
+
+    def render(self, index, phase):
+        frame = self.background()
+        size = self.patch.shape[0]
+        x = self.swing(phase, size)
+        y = (self.height - size) // 2
+        frame[y:y + size, x:x + size] = self.patch
+        return frame
+
+
+class FaceImageSource(SyntheticSource):
+
+    def __init__(self, face_path, **kwargs):
+        super(FaceImageSource, self).__init__(**kwargs)
+        face = cv2.imread(face_path)
+        if face is None:
+            raise IOError("Could not read face image '{}'".format(face_path))
+
+        size = self.height // 3
+        self.face = cv2.resize(face, (size * face.shape[1] // face.shape[0], size))
+
+    def render(self, index, phase):
+        frame = self.background()
+        height, width = self.face.shape[:2]
+        x = self.swing(phase, width)
+        y = (self.height - height) // 2
+        frame[y:y + height, x:x + width] = self.face
+        return frame
+
+
+def create_source(source):
+    # a camera index, a video file, a directory of frames or a source object
+    if isinstance(source, int):
+        return CameraSource(source)
+    if isinstance(source, str):
+        if os.path.isdir(source):
+            return ImageSequenceSource(source)
+        return VideoFileSource(source)
+    return source
@@ -0,0 +1,95 @@
+import math
+import threading
+import time
+
+
+class FixedTimestep:
+    """Turns elapsed wall time into a whole number of physics steps.
+
+    Time not spent on a step carries over to the next frame, so the game
+    advances step seconds per step whatever a frame costs. After a stall
+    at most max_steps run and the rest of the backlog is dropped.
+    """
+
+    def __init__(self, step=0.05, max_steps=5):
+        self.step = step
+        self.max_steps = max_steps
+        self.last = time.monotonic()
+        self.accumulator = 0.0
+
+    def reset(self):
+        self.last = time.monotonic()
+        self.accumulator = 0.0
+
+    def advance(self):
+        now = time.monotonic()
+        self.accumulator += now - self.last
+        self.last = now
+
+        steps = int(self.accumulator // self.step)
+        if steps > self.max_steps:
+            steps = self.max_steps
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= steps * self.step
+
+        return steps
+
+    def delay(self):
+        # milliseconds until the next step is due, for after(), rounded up
+        # so the loop does not wake just before it
+        remaining = self.step - self.accumulator - (time.monotonic() - self.last)
+        return max(math.ceil(remaining * 1000), 1)
+
+
+def wait_for_frame(joystick, timeout=0.1):
+    # blocks until the joystick's capture holds a frame it has not seen yet
+    wait = getattr(joystick.cap, 'wait_for_frame', None)
+    if wait is None:
+        time.sleep(0.005)
+    else:
+        wait(joystick.frame_index, timeout)
+
+
+class AsyncVision:
+    """Runs the detection of a joystick on its own thread.
+
+    read() detects on the newest frame and returns the side, the game
+    picks up `side` whenever it ticks. The joystick must only be used by
+    this thread between start() and stop(). If read() raises, the thread
+    stops, `side` goes back to the default and the exception is kept in
+    `error` for the game to raise.
+    """
+
+    def __init__(self, read, default=None):
+        self.read = read
+        self.default = default
+        self.side = default
+        self.error = None
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.thread is not None:
+            return
+
+        self.running = True
+        self.error = None
+        self.thread = threading.Thread(target=self.vision_loop, daemon=True)
+        self.thread.start()
+
+    def vision_loop(self):
+        try:
+            while self.running:
+                self.side = self.read()
+        except Exception as error:
+            self.side = self.default
+            self.error = error
+            self.running = False
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.side = self.default
@@ -0,0 +1,189 @@
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+
+import EDJD_IVC_2223_TPI_17010_23155 as colour_game
+from EDJD_IVC_2223_TP2_17010_23155 import MoveJoystick
+from EDJD_IVC_2223_TP3_17010_23155 import FaceJoystick
+from frame_capture import FrameCapture, FrameSlot, get_screen
+from instrumentation import get_profiler
+from preview import create_preview
+
+
+class Screen(Enum):
+    LEFT = 0
+    RIGHT = 1
+    CENTER = 2
+
+
+# the scripts disagree on the name of the middle (MIDDLE or CENTER), so
+# decisions are compared by name
+DIRECTIONS = {'LEFT': -1, 'RIGHT': 1}
+
+
+class Detector:
+    """Common interface over the game joysticks: a side and a confidence per frame.
+
+    detect(joystick) runs the wrapped joystick on the frame in its slot and
+    returns the script's Screen, confidence(joystick) scores it from 0 to 1.
+    """
+
+    def __init__(self, name, joystick, detect, confidence, weight=1.0):
+        self.name = name
+        self.joystick = joystick
+        self.detect = detect
+        self.confidence = confidence
+        self.weight = weight
+        self.slot = FrameSlot()
+        joystick.cap = self.slot
+
+    def open_window(self, frame, frame_time, frame_index):
+        self.slot.put(frame, frame_time, frame_index)
+        self.joystick.open_window()
+
+    def update(self, frame, frame_time, frame_index):
+        self.slot.put(frame, frame_time, frame_index)
+        side = self.detect(self.joystick)
+        return DIRECTIONS.get(side.name, 0), self.confidence(self.joystick), self.joystick.position
+
+    def pause(self):
+        self.joystick.pause()
+
+    def destroy_window(self):
+        self.joystick.destroy_window()
+
+
+def colour_detector(weight=1.0, **kwargs):
+    def detect(joystick):
+        joystick.detect_camera_object()
+        return joystick.side
+
+    joystick = colour_game.ObjectJoystick(preview='headless', **kwargs)
+    return Detector('colour', joystick, detect, lambda joystick: float(joystick.track_window is not None), weight)
+
+
+def motion_detector(weight=0.5, **kwargs):
+    def confidence(joystick):
+        left_move, right_move = joystick.motion
+        if left_move + right_move == 0:
+            return 0.0
+        return float(abs(left_move - right_move) / (left_move + right_move))
+
+    joystick = MoveJoystick(preview='headless', **kwargs)
+    return Detector('motion', joystick, lambda joystick: joystick.on_move_detection, confidence, weight)
+
+
+def face_detector(weight=1.0, **kwargs):
+    joystick = FaceJoystick(preview='headless', **kwargs)
+    return Detector('face', joystick, lambda joystick: joystick.face_on_detection,
+                    lambda joystick: float(len(joystick.face_box) > 0), weight)
+
+
+class HybridJoystick:
+    """Runs several detectors on the same frame in parallel and fuses them.
+
+    Each detector votes -1 (left), 0 or +1 (right), scaled by its weight and
+    confidence. The weighted mean picks LEFT or RIGHT once it passes the
+    threshold. OpenCV releases the GIL, so a tick costs about as much as
+    the slowest detector.
+    """
+
+    def __init__(self, detectors=None, threshold=0.3, screen=Screen, preview='throttled', source=0,
+                 name='hybrid', profiler=None):
+        if detectors is None:
+            detectors = [colour_detector(), motion_detector(), face_detector(detect_every=10)]
+
+        self.detectors = detectors
+        self.threshold = threshold
+        self.screen = screen
+        self.side = get_screen(self.screen, 'CENTER')
+        self.position = None
+        self.votes = {}
+        self.cap = FrameCapture(source)
+        self.window_name = "Hybrid Play!"
+        self.preview = create_preview(preview, self.window_name)
+        self.profiler = get_profiler(profiler, name)
+        self.executor = ThreadPoolExecutor(max_workers=len(detectors))
+        self.frame_index = 0
+        self.frame_time = 0.0
+
+    def open_window(self):
+        if not self.cap.isOpened():
+            self.cap.open()
+        self.cap.resume()
+
+        frame, self.frame_time, self.frame_index = self.cap.read_latest()
+        for detector in self.detectors:
+            detector.open_window(frame, self.frame_time, self.frame_index)
+
+    def pause(self):
+        self.cap.pause()
+        self.side = get_screen(self.screen, 'CENTER')
+        self.position = None
+        for detector in self.detectors:
+            detector.pause()
+
+    def update(self):
+        with self.profiler.span('capture'):
+            frame, frame_time, frame_index = self.cap.read_latest()
+
+        if frame is None or frame_index == self.frame_index:
+            return self.side
+
+        self.frame_index = frame_index
+        self.frame_time = frame_time
+
+        with self.profiler.span('detect'):
+            futures = [self.executor.submit(detector.update, frame, frame_time, frame_index)
+                       for detector in self.detectors]
+            votes = [future.result() for future in futures]
+
+        with self.profiler.span('preview'):
+            if self.preview.due():
+                self.preview.show(self.preview.mirror(frame))
+
+        self.votes = {}
+        score = 0.0
+        total = 0.0
+        position = 0.0
+        position_total = 0.0
+        for detector, (direction, confidence, detector_position) in zip(self.detectors, votes):
+            self.votes[detector.name] = (direction, confidence)
+            score += detector.weight * confidence * direction
+            total += detector.weight * confidence
+            if detector_position is not None:
+                position += detector.weight * confidence * detector_position
+                position_total += detector.weight * confidence
+
+        # detectors that track the player also vote on where they are
+        self.position = position / position_total if position_total > 0 else None
+
+        if total > 0 and score / total < -self.threshold:
+            self.side = get_screen(self.screen, 'LEFT')
+        elif total > 0 and score / total > self.threshold:
+            self.side = get_screen(self.screen, 'RIGHT')
+        else:
+            self.side = get_screen(self.screen, 'CENTER')
+
+        return self.side
+
+    def detect_camera_object(self):
+        # same interface as ObjectJoystick, so the colour game can drive it
+        self.update()
+
+    def destroy_window(self):
+        cap = self.cap
+
+        if cap.isOpened():
+            cap.release()
+            self.frame_index = 0
+            for detector in self.detectors:
+                detector.destroy_window()
+            self.preview.close()
+
+
+if __name__ == '__main__':
+    root = tk.Tk()
+    root.title('Break those Bricks!')
+    game = colour_game.Game(root, joystick=HybridJoystick(screen=colour_game.Screen))
+    game.mainloop()
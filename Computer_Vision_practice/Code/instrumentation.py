@@ -0,0 +1,140 @@
+import csv
+import json
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+
+class NullSpan:
+    # returned by a disabled profiler, so timing a stage costs one call
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.samples.append(time.perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    """Rolling per-stage timings of the vision pipeline and the game loop.
+
+    Each stage keeps its last `window` durations, summarised on demand as
+    percentiles. While disabled, span() hands back a shared no-op context.
+    """
+
+    def __init__(self, enabled=False, window=300):
+        self.enabled = enabled
+        self.window = window
+        self.stages = {}
+
+    def span(self, stage):
+        if not self.enabled:
+            return NULL_SPAN
+
+        samples = self.stages.get(stage)
+        if samples is None:
+            samples = self.stages[stage] = deque(maxlen=self.window)
+
+        return Span(samples)
+
+    def reset(self):
+        self.stages = {}
+
+    def summary(self):
+        summary = {}
+
+        # spans are recorded on the vision thread while the game summarises
+        # on the Tk thread, so both the stages and their samples are copied
+        for stage, samples in list(self.stages.items()):
+            samples = list(samples)
+            if len(samples) == 0:
+                continue
+
+            values = np.array(samples) * 1000
+            summary[stage] = {
+                'count': len(values),
+                'mean_ms': float(values.mean()),
+                'p50_ms': float(np.percentile(values, 50)),
+                'p95_ms': float(np.percentile(values, 95)),
+                'p99_ms': float(np.percentile(values, 99)),
+                'max_ms': float(values.max()),
+            }
+
+        return summary
+
+    def dump_json(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.summary(), file, indent=2)
+
+    def dump_csv(self, path):
+        fields = ['stage', 'count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms']
+
+        with open(path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=fields)
+            writer.writeheader()
+            for stage, row in self.summary().items():
+                writer.writerow(dict(row, stage=stage))
+
+    def overlay_text(self):
+        lines = []
+
+        for stage, row in sorted(self.summary().items()):
+            lines.append('{:<18} {:6.2f} {:6.2f} ms'.format(stage, row['p50_ms'], row['p95_ms']))
+
+        return '\n'.join(lines)
+
+
+class ScopedProfiler:
+    # the spans of one joystick, kept as '<name>.<stage>' in a shared
+    # profiler so joysticks running side by side never mix their samples
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.prefix = name + '.'
+        self.names = {}
+
+    @property
+    def enabled(self):
+        return self.profiler.enabled
+
+    def span(self, stage):
+        if not self.profiler.enabled:
+            return NULL_SPAN
+
+        name = self.names.get(stage)
+        if name is None:
+            name = self.names[stage] = self.prefix + stage
+        return self.profiler.span(name)
+
+
+# shared by the joysticks and the game unless they are given their own,
+# IVC_PROFILE=1 turns it on
+PROFILER = Profiler(enabled=os.environ.get('IVC_PROFILE') == '1')
+
+
+def get_profiler(profiler, name=None):
+    if profiler is None:
+        profiler = PROFILER
+    if name is not None:
+        return ScopedProfiler(profiler, name)
+    return profiler
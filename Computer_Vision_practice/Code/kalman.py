@@ -0,0 +1,59 @@
+import numpy as np
+
+
+class KalmanPredictor:
+    """Constant-velocity Kalman filter over one coordinate.
+
+    update(position, t) folds in a position measured on the frame captured
+    at time t, predict(t) extrapolates to a later time, such as when the
+    paddle is drawn. Without new measurements the prediction coasts for at
+    most max_coast seconds.
+    """
+
+    def __init__(self, process_noise=4.0, measurement_noise=1e-4, max_coast=0.3, lead=0.0):
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.max_coast = max_coast
+        # extra seconds to look ahead, for the delay of the display itself
+        self.lead = lead
+        self.state = None
+        self.covariance = None
+        self.time = 0.0
+
+    def reset(self):
+        self.state = None
+        self.covariance = None
+
+    def propagate(self, t):
+        dt = t - self.time
+        if dt <= 0:
+            return
+
+        transition = np.array([[1.0, dt], [0.0, 1.0]])
+        # white noise acceleration
+        noise = self.process_noise * np.array([[dt ** 3 / 3, dt ** 2 / 2], [dt ** 2 / 2, dt]])
+
+        self.state = transition @ self.state
+        self.covariance = transition @ self.covariance @ transition.T + noise
+        self.time = t
+
+    def update(self, position, t):
+        if self.state is None:
+            self.state = np.array([position, 0.0])
+            self.covariance = np.diag([self.measurement_noise, 1.0])
+            self.time = t
+            return
+
+        self.propagate(t)
+
+        # only the position is measured
+        innovation = position - self.state[0]
+        gain = self.covariance[:, 0] / (self.covariance[0, 0] + self.measurement_noise)
+        self.state = self.state + gain * innovation
+        self.covariance = self.covariance - np.outer(gain, self.covariance[0, :])
+
+    def predict(self, t):
+        if self.state is None or t - self.time > self.max_coast:
+            return None
+
+        return float(self.state[0] + self.state[1] * (t + self.lead - self.time))
@@ -0,0 +1,179 @@
+import cv2
+import numpy as np
+
+
+def count_votes(flow_xx, flow_threshold, move_threshold, out=None):
+    # out is an optional boolean buffer the size of flow_xx
+    left_move = np.count_nonzero(np.less(flow_xx, -flow_threshold, out=out))
+    right_move = np.count_nonzero(np.greater(flow_xx, flow_threshold, out=out))
+
+    if left_move < move_threshold:
+        left_move = 0
+
+    if right_move < move_threshold:
+        right_move = 0
+
+    return left_move, right_move
+
+
+class FarnebackFlow:
+    """Dense Farneback flow over the whole frame, the original engine."""
+
+    def __init__(self, scale=1.0):
+        self.win_size = max(int(round(10 * scale)), 3)
+        self.flow_threshold = 2.0 * scale
+        self.move_threshold = 300 * scale * scale
+        self.flow = None
+        self.votes = None
+
+    def reset(self):
+        pass
+
+    def motion(self, previous_gray, next_gray):
+        # the flow and vote buffers are reused while the frame size holds,
+        # without OPTFLOW_USE_INITIAL_FLOW the old flow is only overwritten
+        self.flow = cv2.calcOpticalFlowFarneback(prev=previous_gray, next=next_gray, flow=self.flow,
+                                                 pyr_scale=0.5,  # 0.5,
+                                                 levels=1,  # 3,
+                                                 winsize=self.win_size,  # 15,
+                                                 iterations=1,  # 3,
+                                                 poly_n=5,
+                                                 poly_sigma=1.1,
+                                                 flags=0)
+        farneback = self.flow
+        if self.votes is None or self.votes.shape != farneback.shape[:2]:
+            self.votes = np.empty(farneback.shape[:2], bool)
+
+        # flow_norm = np.sqrt(farneback[:, :, 0] ** 2 + farneback[:, :, 1] ** 2)
+        # flow_norm_norm = cv2.normalize(flow_norm, None, 0.0, 1.0, cv2.NORM_MINMAX)
+        # cv2.imshow("Flow", flow_norm_norm)
+
+        return count_votes(farneback[:, :, 0], self.flow_threshold, self.move_threshold, self.votes)
+
+
+class DISFlow:
+    """Dense inverse search flow with the ultrafast preset."""
+
+    def __init__(self, scale=1.0):
+        self.dis = cv2.DISOpticalFlow_create(cv2.DISOPTICAL_FLOW_PRESET_ULTRAFAST)
+        self.flow_threshold = 2.0 * scale
+        self.move_threshold = 300 * scale * scale
+        self.votes = None
+
+    def reset(self):
+        pass
+
+    def motion(self, previous_gray, next_gray):
+        # DIS takes a flow passed in as its initial guess, so it gets None
+        flow = self.dis.calc(previous_gray, next_gray, None)
+        if self.votes is None or self.votes.shape != flow.shape[:2]:
+            self.votes = np.empty(flow.shape[:2], bool)
+
+        return count_votes(flow[:, :, 0], self.flow_threshold, self.move_threshold, self.votes)
+
+
+class LucasKanadeFlow:
+    """Sparse pyramidal Lucas-Kanade on a set of good features."""
+
+    def __init__(self, scale=1.0, max_points=100, min_points=10, reseed_every=10):
+        self.flow_threshold = 2.0 * scale
+        self.min_distance = max(int(round(10 * scale)), 3)
+        self.win_size = max(int(round(15 * scale)), 5)
+        self.max_points = max_points
+        self.min_points = min_points
+        self.reseed_every = reseed_every
+        self.points = None
+        self.frames_since_seed = 0
+
+    def reset(self):
+        self.points = None
+
+    def seed(self, gray):
+        self.points = cv2.goodFeaturesToTrack(gray, maxCorners=self.max_points, qualityLevel=0.01,
+                                              minDistance=self.min_distance)
+        self.frames_since_seed = 0
+
+    def motion(self, previous_gray, next_gray):
+        # points are followed from pair to pair, the corner search only runs
+        # again every reseed_every frames or when too few points survive
+        if (self.points is None or len(self.points) < self.min_points
+                or self.frames_since_seed >= self.reseed_every):
+            self.seed(previous_gray)
+
+        if self.points is None:
+            return 0, 0
+
+        next_points, status, _ = cv2.calcOpticalFlowPyrLK(previous_gray, next_gray, self.points, None,
+                                                          winSize=(self.win_size, self.win_size),
+                                                          maxLevel=2)
+        found = status.ravel() == 1
+        flow_xx = (next_points - self.points)[found, 0, 0]
+
+        self.points = next_points[found]
+        self.frames_since_seed += 1
+
+        # every point that moved further than the threshold is one vote
+        return count_votes(flow_xx, self.flow_threshold, self.min_points // 2)
+
+
+class FrameDifference:
+    """Motion energy of consecutive frames, projected onto the columns.
+
+    Pixels that changed by more than `threshold` are summed per column and
+    the centroid of that projection is followed from pair to pair. When it
+    shifts by more than a couple of pixels, every changed pixel votes for
+    that direction. `position` is the centroid as a fraction of the width.
+    """
+
+    def __init__(self, scale=1.0, threshold=25):
+        self.threshold = threshold
+        self.min_shift = 2.0 * scale
+        self.move_threshold = 300 * scale * scale
+        self.difference = None
+        self.columns = None
+        self.centroid = None
+        self.position = None
+
+    def reset(self):
+        self.centroid = None
+        self.position = None
+
+    def motion(self, previous_gray, next_gray):
+        self.difference = cv2.absdiff(previous_gray, next_gray, self.difference)
+        cv2.threshold(self.difference, self.threshold, 1, cv2.THRESH_BINARY, dst=self.difference)
+        energy = cv2.reduce(self.difference, 0, cv2.REDUCE_SUM, dtype=cv2.CV_32S).ravel()
+
+        total = int(energy.sum())
+        if total < self.move_threshold:
+            # a player standing still stays where they were last seen
+            return 0, 0
+
+        if self.columns is None or len(self.columns) != len(energy):
+            self.columns = np.arange(len(energy), dtype=np.float64)
+
+        centroid = float(energy @ self.columns) / total
+        previous = self.centroid
+        self.centroid = centroid
+        self.position = centroid / len(energy)
+
+        if previous is None:
+            return 0, 0
+        if centroid < previous - self.min_shift:
+            return total, 0
+        if centroid > previous + self.min_shift:
+            return 0, total
+        return 0, 0
+
+
+FLOW_ENGINES = {
+    'farneback': FarnebackFlow,
+    'dis': DISFlow,
+    'lucas_kanade': LucasKanadeFlow,
+    'difference': FrameDifference,
+}
+
+
+def create_flow_engine(engine, scale=1.0):
+    if isinstance(engine, str):
+        return FLOW_ENGINES[engine](scale)
+    return engine
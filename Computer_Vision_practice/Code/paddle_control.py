@@ -0,0 +1,59 @@
+import time
+
+
+class PaddleControl:
+    """Turns what a joystick sees into a paddle offset per physics step.
+
+    mode='step' moves the paddle by the fixed step of the joystick's side.
+    mode='proportional' smooths the joystick's position (0 at the left of
+    the screen, 1 at the right) and moves the paddle straight to the
+    matching place, by at most max_speed pixels per step when given. While
+    nothing is tracked it falls back to the side.
+
+    With a predictor (see kalman.py) the position is extrapolated from the
+    capture time of the frame to now instead of smoothed, and keeps coming
+    for frames where the detection failed.
+    """
+
+    def __init__(self, mode='proportional', smoothing=0.5, max_speed=None, predictor=None):
+        self.mode = mode
+        self.smoothing = smoothing
+        self.max_speed = max_speed
+        self.predictor = predictor
+        self.position = None
+        self.frame_time = None
+
+    def reset(self):
+        self.position = None
+        self.frame_time = None
+        if self.predictor is not None:
+            self.predictor.reset()
+
+    def update(self, position, frame_time=None, now=None):
+        if self.mode != 'proportional':
+            self.position = None
+        elif self.predictor is not None:
+            # measurements are only folded in once per frame
+            if position is not None and frame_time != self.frame_time:
+                self.predictor.update(position, frame_time)
+            self.frame_time = frame_time
+            # a replay passes the recorded time in now
+            self.position = self.predictor.predict(time.monotonic() if now is None else now)
+        elif position is None:
+            self.position = None
+        elif self.position is None:
+            self.position = position
+        else:
+            self.position += self.smoothing * (position - self.position)
+
+    def offset(self, paddle, width, side_offset):
+        if self.position is None:
+            return side_offset
+
+        position = max(0.0, min(1.0, self.position))
+        target = paddle.width / 2 + position * (width - paddle.width)
+        offset = target - paddle.x
+        if self.max_speed is not None:
+            offset = max(-self.max_speed, min(self.max_speed, offset))
+
+        return offset
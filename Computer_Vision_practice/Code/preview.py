@@ -0,0 +1,101 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class Preview:
+    """Camera window of a joystick.
+
+    'window' shows every processed frame at full size, 'throttled' shows a
+    downscaled frame at most once every interval seconds and 'headless'
+    never draws, shows or logs anything.
+
+    HighGUI is not thread-safe, so a frame shown from any other thread is
+    only copied over, and flush() shows it from the main thread.
+    """
+
+    def __init__(self, window_name, mode='window', scale=0.5, interval=0.2):
+        self.window_name = window_name
+        self.mode = mode
+        self.scale = scale
+        self.interval = interval
+        self.last_shown = 0.0
+        self.opened = False
+        self.mirrored = None
+        self.handoff = None
+        self.pending = False
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.mode != 'headless'
+
+    def due(self):
+        # joysticks only draw on frames that will actually be shown
+        if self.mode == 'window':
+            return True
+        if self.mode == 'throttled':
+            return time.monotonic() - self.last_shown >= self.interval
+        return False
+
+    def mirror(self, image):
+        # the player sees the camera as a mirror, flipped into a reused buffer
+        self.mirrored = cv2.flip(image, 1, dst=self.mirrored)
+        return self.mirrored
+
+    def show(self, image):
+        if not self.due():
+            return
+
+        if self.mode == 'throttled':
+            self.last_shown = time.monotonic()
+            if self.scale < 1:
+                image = cv2.resize(image, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_NEAREST)
+
+        if threading.current_thread() is not threading.main_thread():
+            with self.lock:
+                if self.handoff is None or self.handoff.shape != image.shape:
+                    self.handoff = np.empty_like(image)
+                np.copyto(self.handoff, image)
+                self.pending = True
+            return
+
+        cv2.imshow(self.window_name, image)
+        self.opened = True
+
+    def flush(self):
+        # called by the game loop on the Tk thread, shows the frame the
+        # vision thread handed over and pumps the window's events
+        with self.lock:
+            if self.pending:
+                cv2.imshow(self.window_name, self.handoff)
+                self.opened = True
+                self.pending = False
+        if self.opened:
+            cv2.waitKey(1)
+
+    def log(self, text):
+        if self.enabled:
+            print(text)
+
+    def close(self):
+        with self.lock:
+            self.pending = False
+        if self.opened:
+            cv2.destroyWindow(self.window_name)
+            self.opened = False
+
+
+def flush_preview(joystick):
+    # a joystick in a worker process has no preview in this one
+    preview = getattr(joystick, 'preview', None)
+    if preview is not None:
+        preview.flush()
+
+
+def create_preview(preview, window_name):
+    if isinstance(preview, str):
+        return Preview(window_name, preview)
+    return preview
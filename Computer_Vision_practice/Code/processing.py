@@ -0,0 +1,42 @@
+import cv2
+
+
+def downscale(image, scale, buffers=None):
+    # with a buffers dict the outputs of each step are reused from frame to
+    # frame, OpenCV only reallocates them when the frame size changes
+    if scale >= 1:
+        return image
+    if buffers is None:
+        buffers = {}
+
+    # halve with the gaussian pyramid while we can, resize the remainder
+    level = 0
+    while scale <= 0.5:
+        key = ('pyramid', level)
+        image = buffers[key] = cv2.pyrDown(image, dst=buffers.get(key))
+        scale *= 2
+        level += 1
+
+    if scale < 1:
+        image = buffers['resize'] = cv2.resize(image, None, dst=buffers.get('resize'), fx=scale, fy=scale,
+                                               interpolation=cv2.INTER_AREA)
+
+    return image
+
+
+def scale_kernel(size, scale):
+    # gaussian kernels must stay odd
+    size = max(int(round(size * scale)), 1)
+    if size % 2 == 0:
+        size += 1
+    return size
+
+
+def scale_box(box, ratio):
+    return [int(value * ratio) for value in box]
+
+
+def mirror_box(box, width):
+    # frames are processed as captured and only the preview is mirrored
+    x, y, box_width, box_height = box
+    return [width - x - box_width, y, box_width, box_height]
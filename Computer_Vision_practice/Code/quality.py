@@ -0,0 +1,116 @@
+import json
+import time
+from collections import deque
+
+# from best to cheapest: processing scale (on top of the joystick's own),
+# blur kernel factor and frames skipped between detections
+QUALITY_TIERS = [
+    {'name': 'full', 'scale': 1.0, 'blur': 1.0, 'skip': 0},
+    {'name': 'high', 'scale': 0.75, 'blur': 1.0, 'skip': 0},
+    {'name': 'medium', 'scale': 0.5, 'blur': 0.6, 'skip': 0},
+    {'name': 'low', 'scale': 0.5, 'blur': 0.4, 'skip': 1},
+    {'name': 'minimal', 'scale': 0.25, 'blur': 0.4, 'skip': 2},
+]
+
+
+class NullGovernor:
+    # used when no governor is given, every frame is detected as is
+
+    def attach(self, apply):
+        pass
+
+    def run(self, detect, *args):
+        detect(*args)
+        return True
+
+
+NULL_GOVERNOR = NullGovernor()
+
+
+class QualityGovernor:
+    """Steps detection quality down when frames go over the time budget.
+
+    run(detect, *args) times one detection. When the mean of the last
+    `window` detections is over `budget` seconds the joystick drops a tier,
+    once `patience` detections in a row stayed under headroom * budget it
+    climbs back one. report() tells which tiers the game ran at.
+    """
+
+    def __init__(self, budget=0.03, headroom=0.5, window=10, patience=30, tiers=QUALITY_TIERS):
+        self.budget = budget
+        self.headroom = headroom
+        self.patience = patience
+        self.tiers = tiers
+        self.tier = 0
+        self.samples = deque(maxlen=window)
+        self.calm = 0
+        self.skipped = 0
+        self.frames = 0
+        self.frames_per_tier = {tier['name']: 0 for tier in tiers}
+        self.changes = []
+        self.apply = None
+
+    @property
+    def current(self):
+        return self.tiers[self.tier]
+
+    def attach(self, apply):
+        # apply(tier) reconfigures the joystick, called now and on every change
+        self.apply = apply
+        apply(self.current)
+
+    def run(self, detect, *args):
+        # returns False when the frame is skipped
+        if self.skipped < self.current['skip']:
+            self.skipped += 1
+            return False
+        self.skipped = 0
+
+        start = time.perf_counter()
+        detect(*args)
+        self.measure(time.perf_counter() - start)
+        return True
+
+    def measure(self, seconds):
+        self.frames += 1
+        self.frames_per_tier[self.current['name']] += 1
+        self.samples.append(seconds)
+
+        if seconds < self.budget * self.headroom:
+            self.calm += 1
+        else:
+            self.calm = 0
+
+        # a tier is judged on a full window of its own detections
+        full = len(self.samples) == self.samples.maxlen
+        mean = sum(self.samples) / len(self.samples)
+        if full and mean > self.budget and self.tier < len(self.tiers) - 1:
+            self.set_tier(self.tier + 1)
+        elif self.calm >= self.patience and self.tier > 0:
+            self.set_tier(self.tier - 1)
+
+    def set_tier(self, tier):
+        self.tier = tier
+        self.samples.clear()
+        self.calm = 0
+        self.changes.append((self.frames, self.current['name']))
+        if self.apply is not None:
+            self.apply(self.current)
+
+    def report(self):
+        return {
+            'tier': self.current['name'],
+            'frames': self.frames,
+            'frames_per_tier': dict(self.frames_per_tier),
+            'changes': [{'frame': frame, 'tier': name} for frame, name in self.changes],
+        }
+
+    def dump_json(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.report(), file, indent=2)
+
+
+def get_governor(governor):
+    if governor is None:
+        return NULL_GOVERNOR
+    return governor
@@ -0,0 +1,203 @@
+"""Per-tick log of a game session and its headless replay.
+
+A SessionRecorder appends one TICK_DTYPE record per physics step to a
+binary file: the vision input the step used, the paddle offset it applied
+and the game state after it. read_session() maps the records back with
+np.memmap, and replay() runs them through a GameModel without camera or
+Tk, many times faster than the game played.
+"""
+import argparse
+import json
+import math
+import os
+import struct
+import time
+
+import numpy as np
+
+from breakout_model import BrickGrid, GameModel, State
+from kalman import KalmanPredictor
+from paddle_control import PaddleControl
+
+MAGIC = b'IVCLOG1\n'
+
+TICK_DTYPE = np.dtype([
+    ('time', '<f8'),  # monotonic time of the step
+    ('frame', '<i8'),  # game loop iteration the step ran in
+    ('frame_index', '<i8'),  # camera frame the vision input came from
+    ('frame_time', '<f8'),  # capture time of that frame
+    ('side', 'i1'),  # -1 left, 0 centre, 1 right
+    ('position', '<f8'),  # tracked x from 0 to 1, NaN when nothing was tracked
+    ('offset', '<f8'),  # paddle offset applied on the step
+    ('state', 'i1'),  # State value after the step
+    ('lives', 'i1'),
+    ('remaining', '<i4'),
+    ('paddle_x', '<f8'),
+    ('ball_x', '<f8'),
+    ('ball_y', '<f8'),
+])
+
+
+class SessionRecorder:
+    # the header keeps what replay() needs to rebuild the model, records are
+    # only ever appended so a crashed game still leaves a readable log
+
+    def __init__(self, path, model, step):
+        bricks = model.bricks
+        header = {
+            'dtype': TICK_DTYPE.descr,
+            'width': model.width,
+            'height': model.height,
+            'lives': model.lives,
+            'step': step,
+            'bricks': {'hits': bricks.hits.tolist(), 'x': bricks.x, 'y': bricks.y,
+                       'cell_width': bricks.cell_width, 'cell_height': bricks.cell_height},
+        }
+        data = json.dumps(header).encode('utf-8')
+
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.file.write(struct.pack('<I', len(data)))
+        self.file.write(data)
+        self.tick = np.zeros((), TICK_DTYPE)
+        self.count = 0
+
+    def record(self, model, state, offset, side_offset, position, frame, frame_index, frame_time):
+        tick = self.tick
+        tick['time'] = time.monotonic()
+        tick['frame'] = frame
+        tick['frame_index'] = frame_index
+        tick['frame_time'] = frame_time
+        tick['side'] = (side_offset > 0) - (side_offset < 0)
+        tick['position'] = math.nan if position is None else position
+        tick['offset'] = offset
+        tick['state'] = state.value
+        tick['lives'] = model.lives
+        tick['remaining'] = model.bricks.remaining
+        tick['paddle_x'] = model.paddle.x
+        tick['ball_x'] = model.ball.x
+        tick['ball_y'] = model.ball.y
+        self.file.write(tick.tobytes())
+        self.count += 1
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+def read_session(path):
+    # returns the header and the records, mapped rather than loaded
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise IOError("'{}' is not a session log".format(path))
+        length, = struct.unpack('<I', file.read(4))
+        header = json.loads(file.read(length).decode('utf-8'))
+
+    # the layout the log was written with, so older logs still read
+    dtype = np.dtype([tuple(field) for field in header['dtype']])
+    offset = len(MAGIC) + 4 + length
+    # a record cut short by a crash is left out
+    count = (os.path.getsize(path) - offset) // dtype.itemsize
+    if count == 0:
+        return header, np.zeros(0, dtype)
+    return header, np.memmap(path, dtype, 'r', offset, (count,))
+
+
+def create_model(header):
+    bricks = header['bricks']
+    grid = BrickGrid(bricks['hits'], bricks['x'], bricks['y'], bricks['cell_width'], bricks['cell_height'])
+    return GameModel(header['width'], header['height'], header['lives'], grid)
+
+
+def replay(path, control=None):
+    """Runs a recorded session again, headless and as fast as possible.
+
+    Without a control the recorded offsets are applied and every step is
+    checked against the recorded state, so a divergence points at a change
+    in the game rules. With a PaddleControl the offsets are worked out again
+    from the recorded vision input, to compare controllers on the same trace.
+    """
+    header, ticks = read_session(path)
+    model = create_model(header)
+    model.start()
+    if control is not None:
+        control.reset()
+
+    divergences = 0
+    first_divergence = None
+    steps = 0
+    frame = None
+    state = State.RUNNING
+
+    start = time.perf_counter()
+    for tick in ticks:
+        if control is None:
+            offset = float(tick['offset'])
+        else:
+            # the game updates the control once per loop, not per step
+            if tick['frame'] != frame:
+                frame = tick['frame']
+                position = float(tick['position'])
+                control.update(None if math.isnan(position) else position, float(tick['frame_time']),
+                               float(tick['time']))
+            offset = control.offset(model.paddle, model.width, int(tick['side']) * header['step'])
+
+        state = model.step(offset)
+        steps += 1
+
+        if control is None and (state.value != tick['state'] or model.paddle.x != tick['paddle_x']
+                                or model.ball.x != tick['ball_x'] or model.ball.y != tick['ball_y']):
+            divergences += 1
+            if first_divergence is None:
+                first_divergence = steps - 1
+
+        if state == State.LOST_LIFE:
+            model.add_ball()
+            model.start()
+            if control is not None:
+                control.reset()
+        elif state != State.RUNNING:
+            break
+    elapsed = time.perf_counter() - start
+
+    report = {
+        'steps': steps,
+        'recorded_steps': len(ticks),
+        'state': state.name,
+        'lives': model.lives,
+        'remaining': model.bricks.remaining,
+        'steps_per_s': steps / elapsed if elapsed > 0 else 0.0,
+        'divergences': divergences,
+        'first_divergence': first_divergence,
+    }
+    if len(ticks):
+        played = float(ticks['time'][-1] - ticks['time'][0])
+        report['speedup'] = played / elapsed if elapsed > 0 else 0.0
+        # age of the vision input each step used, to bisect slowdowns
+        seen = ticks['frame_time'] > 0
+        if np.any(seen):
+            latency = (ticks['time'][seen] - ticks['frame_time'][seen]) * 1000
+            report['latency_ms'] = {'p50': float(np.percentile(latency, 50)),
+                                    'p95': float(np.percentile(latency, 95))}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a recorded game session headless.')
+    parser.add_argument('path')
+    parser.add_argument('--control', choices=['proportional', 'step'],
+                        help='work the offsets out again with this controller')
+    parser.add_argument('--predict', action='store_true', help='with --control, add a Kalman predictor')
+    args = parser.parse_args(argv)
+
+    control = None
+    if args.control is not None:
+        predictor = KalmanPredictor() if args.predict else None
+        control = PaddleControl(args.control, predictor=predictor)
+
+    print(json.dumps(replay(args.path, control), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Equivalence checks for the headless simulation.
+
+    python sim_checks.py
+
+The BrickGrid cell lookup is compared with a scan of every brick, the rule
+canvas.find_overlapping applied before the grid, and BatchBreakout with
+GameModel step for step. Exits with 1 on any mismatch, so a rule change
+that breaks the equivalence shows up.
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from batch_sim import BatchBreakout
+from breakout_model import BrickGrid, GameModel, State, default_bricks, overlaps, random_bricks
+
+PADDLE_STEP = 15
+
+
+def copy_grid(grid):
+    return BrickGrid(grid.hits, grid.x, grid.y, grid.cell_width, grid.cell_height)
+
+
+def get_levels(seed):
+    # the Tk level, a random one and a dense one with many small bricks
+    return {
+        'default': default_bricks(610),
+        'random': random_bricks(10, 8, seed=seed),
+        'dense': random_bricks(30, 40, seed=seed, cell_width=15, cell_height=8),
+    }
+
+
+def choose_action(model, rng):
+    # follows the ball most of the time, so games last and reach the bricks
+    if rng.random() < 0.2:
+        return int(rng.integers(-1, 2))
+    return int(np.sign(model.ball.x - model.paddle.x))
+
+
+def check_brick_grid(grid, steps, seed):
+    # returns the number of steps where the grid disagreed with the scan
+    rng = np.random.default_rng(seed)
+    model = GameModel(bricks=copy_grid(grid))
+    model.start()
+    bricks = model.bricks
+    mismatches = 0
+
+    for _ in range(steps):
+        box = model.ball.get_position()
+        cells = bricks.cells()
+        expected = [cell for cell in cells if overlaps(box, bricks.get_position(cell))]
+        if sorted(bricks.overlapping(box)) != expected or bricks.remaining != len(cells):
+            mismatches += 1
+
+        state = model.step(choose_action(model, rng) * PADDLE_STEP)
+        if state == State.LOST_LIFE:
+            model.add_ball()
+            model.start()
+        elif state != State.RUNNING:
+            break
+
+    return mismatches
+
+
+def check_batch(grid, games, steps, seed):
+    # returns the number of games where the batch and the model disagreed
+    rng = np.random.default_rng(seed)
+    batch = BatchBreakout(games, bricks=grid, paddle_step=PADDLE_STEP)
+    models = [GameModel(bricks=copy_grid(grid)) for _ in range(games)]
+    for model in models:
+        model.start()
+    done = np.zeros(games, bool)
+    diverged = np.zeros(games, bool)
+
+    for _ in range(steps):
+        actions = np.array([0 if done[i] else choose_action(model, rng) for i, model in enumerate(models)])
+        states = batch.step(actions)
+
+        for i, model in enumerate(models):
+            if done[i] or diverged[i]:
+                continue
+
+            state = model.step(actions[i] * PADDLE_STEP)
+            if state == State.LOST_LIFE:
+                model.add_ball()
+                model.start()
+            elif state != State.RUNNING:
+                done[i] = True
+
+            diverged[i] = (states[i] != state.value or batch.paddle_x[i] != model.paddle.x
+                           or batch.ball_x[i] != model.ball.x or batch.ball_y[i] != model.ball.y
+                           or batch.lives[i] != model.lives or batch.remaining[i] != model.bricks.remaining
+                           or not np.array_equal(batch.hits[i], model.bricks.hits))
+
+        if np.all(done | diverged):
+            break
+
+    return int(np.count_nonzero(diverged))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check the headless simulation against its reference rules.')
+    parser.add_argument('--games', type=int, default=50)
+    parser.add_argument('--steps', type=int, default=3000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    failed = False
+    for name, grid in get_levels(args.seed).items():
+        mismatches = check_brick_grid(grid, args.steps, args.seed)
+        print('brick grid {:<8} {} mismatches'.format(name, mismatches))
+        failed |= mismatches > 0
+
+        mismatches = check_batch(grid, args.games, args.steps, args.seed)
+        print('batch      {:<8} {} of {} games mismatched'.format(name, mismatches, args.games))
+        failed |= mismatches > 0
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
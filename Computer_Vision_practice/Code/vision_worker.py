@@ -0,0 +1,283 @@
+import multiprocessing
+import queue
+import threading
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from frame_capture import FrameCapture, FrameSlot, get_screen
+
+
+def attach_shared_memory(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # before Python 3.13 attaching always registers the block with the
+        # resource tracker
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedFrames(FrameSlot):
+    # the joystick's capture inside the worker, hands out the shared memory
+    # slot the game process just filled
+
+    def __init__(self):
+        super(SharedFrames, self).__init__()
+        self.memory = None
+        self.slots = []
+
+    def attach(self, name, shape, dtype):
+        self.close()
+        self.memory = attach_shared_memory(name)
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        self.slots = [np.ndarray(shape, dtype, buffer=self.memory.buf, offset=i * size) for i in range(2)]
+
+    def select(self, slot, frame_time, frame_index):
+        self.put(self.slots[slot], frame_time, frame_index)
+
+    def close(self):
+        self.release()
+        self.slots = []
+        if self.memory is not None:
+            self.memory.close()
+            self.memory = None
+
+
+def run_detection(joystick, detect):
+    # detect names a method (the colour joystick) or a property (the others)
+    detection = getattr(joystick, detect)
+    if callable(detection):
+        detection()
+
+
+def worker_main(create, detect, kwargs, commands, results):
+    try:
+        run_worker(create, detect, kwargs, commands, results)
+    except Exception:
+        # the game only learns about a failure through the results queue
+        results.put(('error', traceback.format_exc()))
+
+
+def run_worker(create, detect, kwargs, commands, results):
+    joystick = create(**kwargs)
+    frames = SharedFrames()
+    joystick.cap = frames
+
+    while True:
+        command = commands.get()
+        kind = command[0]
+
+        if kind == 'frame':
+            _, slot, frame_time, frame_index = command
+            frames.select(slot, frame_time, frame_index)
+            run_detection(joystick, detect)
+            results.put((frame_index, frame_time, joystick.side.name, joystick.position))
+        elif kind == 'attach':
+            frames.attach(*command[1:])
+        elif kind == 'open':
+            joystick.open_window()
+        elif kind == 'pause':
+            joystick.pause()
+        elif kind == 'stop':
+            joystick.destroy_window()
+            frames.close()
+            break
+
+
+class DecisionSlot:
+    # takes the place of the capture for wait_for_frame(): the game waits
+    # for the next decision of the worker rather than the next frame
+
+    def __init__(self):
+        self.decision = (0, 0.0, None, None)
+        self.new_decision = threading.Condition()
+
+    def put(self, decision):
+        with self.new_decision:
+            self.decision = decision
+            self.new_decision.notify_all()
+
+    def wait_for_frame(self, index, timeout=None):
+        with self.new_decision:
+            return self.new_decision.wait_for(lambda: self.decision[0] != index, timeout)
+
+    def reset(self):
+        self.decision = (0, 0.0, None, None)
+
+
+class VisionWorker:
+    """Runs a joystick in a separate process, so detection gets its own core.
+
+    The camera is still read in the game process, which copies each frame
+    into one of two shared memory slots. The worker runs the joystick on it
+    and sends back only the side, the position and the frame index. One
+    frame is in flight at a time, so the slot being written is never the
+    one being read.
+
+    create(**kwargs) builds the joystick in the worker and detect names the
+    method or property that runs it on the current frame. The proxy has the
+    detection calls of all three joysticks, so every game can drive it.
+    """
+
+    def __init__(self, create, detect, screen, source=0, **kwargs):
+        # a worker has no event loop to refresh a camera window
+        kwargs.setdefault('preview', 'headless')
+
+        self.create = create
+        self.detect = detect
+        self.screen = screen
+        self.kwargs = kwargs
+        self.capture = FrameCapture(source)
+        self.cap = DecisionSlot()
+        self.side = get_screen(self.screen, 'CENTER')
+        self.position = None
+        self.frame_index = 0
+        self.frame_time = 0.0
+
+        self.context = multiprocessing.get_context('spawn')
+        self.process = None
+        self.commands = None
+        self.results = None
+        self.feeder = None
+        self.running = False
+        self.error = None
+        self.memory = None
+        self.slots = []
+        self.next_slot = 0
+
+    def open_window(self):
+        if self.process is None:
+            self.commands = self.context.Queue()
+            self.results = self.context.Queue()
+            self.process = self.context.Process(target=worker_main, daemon=True,
+                                                args=(self.create, self.detect, self.kwargs, self.commands,
+                                                      self.results))
+            self.process.start()
+
+        if not self.capture.isOpened():
+            self.capture.open()
+        self.capture.resume()
+        self.commands.put(('open',))
+
+        if self.feeder is None:
+            self.running = True
+            self.feeder = threading.Thread(target=self.feed_loop, daemon=True)
+            self.feeder.start()
+
+    def pause(self):
+        self.capture.pause()
+        self.side = get_screen(self.screen, 'CENTER')
+        self.position = None
+        if self.commands is not None:
+            self.commands.put(('pause',))
+
+    def feed_loop(self):
+        index = 0
+
+        while self.running:
+            if not self.capture.wait_for_frame(index, 0.1):
+                # no frame is in flight, so anything the worker sent is an error
+                self.receive(0)
+                continue
+
+            frame, frame_time, index = self.capture.read_latest()
+            if frame is None:
+                continue
+
+            slot = self.write_frame(frame)
+            self.commands.put(('frame', slot, frame_time, index))
+
+            while self.running:
+                decision = self.receive(0.1)
+                if decision is not None:
+                    self.cap.put(decision)
+                    break
+
+    def receive(self, timeout):
+        # the worker's next decision, None when there is none yet or it failed
+        try:
+            decision = self.results.get(timeout=timeout) if timeout else self.results.get_nowait()
+        except queue.Empty:
+            if not self.process.is_alive():
+                self.fail('vision worker exited with code {}'.format(self.process.exitcode))
+            return None
+
+        if decision[0] == 'error':
+            self.fail('vision worker failed:\n' + decision[1])
+            return None
+        return decision
+
+    def fail(self, message):
+        # stops feeding frames, update() raises the error on the vision
+        # thread and the game raises it again on the Tk thread
+        self.error = message
+        self.running = False
+
+    def write_frame(self, frame):
+        if self.memory is None or self.slots[0].shape != frame.shape:
+            self.release_memory()
+            self.memory = shared_memory.SharedMemory(create=True, size=2 * frame.nbytes)
+            self.slots = [np.ndarray(frame.shape, frame.dtype, buffer=self.memory.buf, offset=i * frame.nbytes)
+                          for i in range(2)]
+            self.commands.put(('attach', self.memory.name, frame.shape, frame.dtype.str))
+
+        slot = self.next_slot
+        self.next_slot = 1 - slot
+        np.copyto(self.slots[slot], frame)
+        return slot
+
+    def release_memory(self):
+        self.slots = []
+        if self.memory is not None:
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+    def update(self):
+        if self.error is not None:
+            raise RuntimeError(self.error)
+
+        frame_index, frame_time, side, position = self.cap.decision
+        if side is None or frame_index == self.frame_index:
+            return self.side
+
+        self.frame_index = frame_index
+        self.frame_time = frame_time
+        self.side = get_screen(self.screen, side)
+        self.position = position
+        return self.side
+
+    def detect_camera_object(self):
+        self.update()
+
+    @property
+    def on_move_detection(self):
+        return self.update()
+
+    @property
+    def face_on_detection(self):
+        return self.update()
+
+    def destroy_window(self):
+        if self.process is None:
+            return
+
+        self.running = False
+        self.feeder.join()
+        self.feeder = None
+
+        self.commands.put(('stop',))
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.process = None
+        self.error = None
+
+        self.capture.release()
+        self.release_memory()
+        self.cap.reset()
+        self.frame_index = 0
+        self.side = get_screen(self.screen, 'CENTER')
+        self.position = None